@@ -0,0 +1,140 @@
+import os
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from metrics import ADMISSION_QUEUE_SECONDS, ADMISSION_REJECTED, LLM_IN_FLIGHT, LLM_QUEUE_DEPTH
+
+# Lower value is admitted first
+PRIORITIES = {"followup": 0, "chat": 1, "batch": 2}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; `retry_after` is in seconds."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"LLM backend is busy ({reason}), retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Limits concurrent LLM calls to `max_concurrent`. Requests beyond that
+    wait in a priority queue of at most `max_queue` entries (follow-ups
+    ahead of new chats, batch jobs last, FIFO within a priority). A
+    request is rejected immediately when the queue is full, or after
+    waiting `queue_timeout` seconds, so clients get a fast 429 rather than
+    a late timeout.
+    """
+
+    def __init__(self, max_concurrent=2, max_queue=16, queue_timeout=30.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self._queue = []
+        self._seq = itertools.count()
+        self._avg_hold = None
+        self.admitted = 0
+        self.rejected = 0
+
+    def retry_after(self):
+        """Rough seconds until a slot frees up for a new arrival."""
+        hold = self._avg_hold or 10.0
+        return max(1, math.ceil(hold * (self.waiting + 1) / self.max_concurrent))
+
+    def check(self):
+        """Fail fast when a new request would be rejected anyway."""
+        if self.active >= self.max_concurrent and self.waiting >= self.max_queue:
+            self._reject("queue_full")
+
+    def _reject(self, reason):
+        self.rejected += 1
+        ADMISSION_REJECTED.labels(reason=reason).inc()
+        raise AdmissionRejected(reason, self.retry_after())
+
+    async def acquire(self, priority="chat"):
+        start = time.perf_counter()
+        if self.active < self.max_concurrent and not self.waiting:
+            self._admit(priority, start)
+            return
+        if self.waiting >= self.max_queue:
+            self._reject("queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (PRIORITIES.get(priority, 1), next(self._seq), future))
+        self.waiting += 1
+        LLM_QUEUE_DEPTH.set(self.waiting)
+        try:
+            await asyncio.wait({future}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            if future.done():
+                # Admitted just as the caller went away: hand the slot on
+                self.release()
+            else:
+                self._abandon(future)
+            raise
+
+        if not future.done():
+            self._abandon(future)
+            self._reject("queue_timeout")
+        ADMISSION_QUEUE_SECONDS.labels(priority=priority).observe(time.perf_counter() - start)
+
+    def _admit(self, priority, start):
+        self.active += 1
+        self.admitted += 1
+        LLM_IN_FLIGHT.set(self.active)
+        ADMISSION_QUEUE_SECONDS.labels(priority=priority).observe(time.perf_counter() - start)
+
+    def _abandon(self, future):
+        future.cancel()
+        self.waiting -= 1
+        LLM_QUEUE_DEPTH.set(self.waiting)
+
+    def release(self):
+        self.active -= 1
+        while self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            if future.done():
+                continue
+            self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+            future.set_result(True)
+            break
+        LLM_IN_FLIGHT.set(self.active)
+        LLM_QUEUE_DEPTH.set(self.waiting)
+
+    @asynccontextmanager
+    async def slot(self, priority="chat"):
+        await self.acquire(priority)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            hold = time.perf_counter() - start
+            self._avg_hold = hold if self._avg_hold is None else 0.8 * self._avg_hold + 0.2 * hold
+            self.release()
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_hold_seconds": round(self._avg_hold, 3) if self._avg_hold is not None else None
+        }
+
+
+def admission_from_env():
+    return AdmissionController(
+        max_concurrent=int(os.environ.get("GRAPH_RAG_LLM_CONCURRENCY", 2)),
+        max_queue=int(os.environ.get("GRAPH_RAG_LLM_QUEUE", 16)),
+        queue_timeout=float(os.environ.get("GRAPH_RAG_LLM_QUEUE_TIMEOUT", 30))
+    )
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from cachetools import LRUCache
+from retrieval_cache import normalize_question
+
+
+class AnswerCache:
+    """
+    Cache of generated answers, keyed on everything that determines them:
+    the normalized question, the packed context, the model, its options and
+    the prompt version. A change to any of them (including a graph update
+    that changes the retrieved context) simply produces a new key.
+
+    Answers are kept in a bounded in-memory LRU. When `path` is set they
+    are also written to a SQLite file, holding at most `disk_maxsize`
+    answers, so they survive restarts.
+    """
+
+    def __init__(self, maxsize=512, path=None, disk_maxsize=10000):
+        self._cache = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self.path = path
+        self.disk_maxsize = disk_maxsize
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db = None
+        self._disk_count = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "key TEXT PRIMARY KEY, answer TEXT NOT NULL, created_at REAL, last_used REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)")
+            self._db.commit()
+            self._disk_count = self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    @staticmethod
+    def make_key(question, context, model, prompt_version, options=None):
+        payload = json.dumps([normalize_question(question), context, model, prompt_version, options],
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # --- Memory tier ---
+    def _get_memory(self, key):
+        with self._lock:
+            answer = self._cache.get(key)
+            if answer is not None:
+                self.hits += 1
+            return answer
+
+    def _record_disk_result(self, key, answer):
+        with self._lock:
+            if answer is None:
+                self.misses += 1
+            else:
+                self._cache[key] = answer
+                self.disk_hits += 1
+        return answer
+
+    # --- Disk tier (blocking; use the async methods from the event loop) ---
+    def _get_disk(self, key):
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute("SELECT answer FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE answers SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            return row[0]
+
+    def _set_disk(self, key, answer):
+        now = time.time()
+        with self._db_lock:
+            inserted = self._db.execute("INSERT OR IGNORE INTO answers VALUES (?, ?, ?, ?)",
+                                        (key, answer, now, now)).rowcount
+            if inserted:
+                self._disk_count += 1
+            else:
+                self._db.execute("UPDATE answers SET answer = ?, last_used = ? WHERE key = ?", (answer, now, key))
+            # Evict in batches once 10% over capacity rather than on every insert
+            if self._disk_count > self.disk_maxsize * 1.1:
+                self._db.execute(
+                    "DELETE FROM answers WHERE key IN ("
+                    "SELECT key FROM answers ORDER BY last_used LIMIT ?)",
+                    (self._disk_count - self.disk_maxsize,)
+                )
+                self._disk_count = self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            self._db.commit()
+
+    def get(self, key):
+        answer = self._get_memory(key)
+        if answer is not None:
+            return answer
+        return self._record_disk_result(key, self._get_disk(key))
+
+    def set(self, key, answer):
+        with self._lock:
+            self._cache[key] = answer
+        if self._db is not None:
+            self._set_disk(key, answer)
+
+    async def async_get(self, key):
+        """`get` with the SQLite lookup run in a worker thread."""
+        answer = self._get_memory(key)
+        if answer is not None:
+            return answer
+        if self._db is None:
+            return self._record_disk_result(key, None)
+        return self._record_disk_result(key, await asyncio.to_thread(self._get_disk, key))
+
+    async def async_set(self, key, answer):
+        """`set` with the SQLite write run in a worker thread."""
+        with self._lock:
+            self._cache[key] = answer
+        if self._db is not None:
+            await asyncio.to_thread(self._set_disk, key, answer)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM answers")
+                self._db.commit()
+                self._disk_count = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            stats = {
+                "size": len(self._cache),
+                "maxsize": self._cache.maxsize,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / total, 4) if total else 0.0
+            }
+        if self._db is not None:
+            stats["disk_size"] = self._disk_count
+            stats["path"] = self.path
+        return stats
+
+
+def answer_cache_from_env():
+    """Build the answer cache from GRAPH_RAG_ANSWER_CACHE_SIZE and, for the
+    persistent tier, GRAPH_RAG_ANSWER_CACHE_DB."""
+    return AnswerCache(
+        maxsize=int(os.environ.get("GRAPH_RAG_ANSWER_CACHE_SIZE", 512)),
+        path=os.environ.get("GRAPH_RAG_ANSWER_CACHE_DB") or None
+    )
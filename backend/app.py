@@ -1,13 +1,39 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, status, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse, Response, ORJSONResponse
+from contextlib import asynccontextmanager
 from typing import List, Optional, Dict, Any
+import os
+import re
+import json
 import time
 import uuid
+import asyncio
+import hashlib
 from datetime import datetime
 
 # Import existing modules
-from retrieval_mechs import retrieve_context
-from run_query import answer_with_graph_rag_llama
+from retrieval_mechs import (async_cached_retrieve_context, async_followup_retrieve_context, async_batch_retrieve_context,
+                             async_get_chunk, retrieval_cache, retrieval_flights)
+from run_query import async_answer_with_graph_rag_llama, async_stream_answer_with_graph_rag_llama, answer_cache, answer_flights, llm_admission
+from admission import AdmissionRejected
+from metrics import start_request_timings, metrics_payload, REQUEST_SECONDS
+from conversation_store import conversation_store_from_env
+from warmup import warmup_from_env
+import retrieval_mechs
+
+readiness, warmup = warmup_from_env()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Warm up in the background so /health can answer 503 until ready
+    task = asyncio.ensure_future(warmup()) if warmup is not None else None
+    yield
+    if task is not None:
+        task.cancel()
+    await retrieval_mechs.async_driver.close()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -15,7 +41,9 @@ app = FastAPI(
     description="A FastAPI application for HTIC Graph RAG system",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -27,9 +55,173 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+class JSONGZipMiddleware(GZipMiddleware):
+    """GZip for regular responses. NDJSON streams pass through untouched so
+    tokens are not held back in the compressor's buffer."""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith(("/stream", "/batch")):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(JSONGZipMiddleware, minimum_size=1000, compresslevel=5)
+
+# Previous turn's retrievals per conversation, reused by follow-ups
+conversation_store = conversation_store_from_env()
+
+MAX_BATCH_QUESTIONS = int(os.environ.get("GRAPH_RAG_MAX_BATCH", 500))
+BATCH_CONCURRENCY = int(os.environ.get("GRAPH_RAG_BATCH_CONCURRENCY", llm_admission.max_concurrent))
+
+def build_context_summary(retrievals):
+    return {
+        "entities_found": [r.get('entity', 'Unknown') for r in retrievals[:3]],  # Top 3 entities
+        "total_relations": sum(len(r.get('neighbors', [])) for r in retrievals),
+        "total_chunks": sum(len(r.get('chunks', [])) for r in retrievals)
+    }
+
+def build_contextual_question(question, original_question, previous_answer):
+    """Create a context-aware question for better follow-up retrieval."""
+    if original_question and previous_answer:
+        return f"Previous question: {original_question}\nPrevious answer: {previous_answer[:200]}...\nFollow-up question: {question}"
+    return question
+
+async def retrieve_followup_context(question, conversation_id, original_question="", previous_answer="",
+                                    multihop=False):
+    """Follow-ups reuse the stored context of the previous turn and only
+    retrieve entities the follow-up newly mentions. Without stored state
+    (unknown or expired conversation) or for multi-hop ranking, fall back
+    to a full retrieval on the context-aware question."""
+    previous = None if multihop else conversation_store.get(conversation_id)
+    if previous is not None:
+        return await async_followup_retrieve_context(question, previous["retrievals"], topk_entities=5)
+
+    contextual_question = build_contextual_question(question, original_question, previous_answer)
+    return await async_cached_retrieve_context(contextual_question, topk_entities=5, combined=True,
+                                               multihop=multihop)
+
+def validate_question(question, conversation_id=None, is_followup=False):
+    if not question:
+        detail = "Follow-up question is required" if is_followup else "Question is required"
+        raise HTTPException(status_code=400, detail=detail)
+
+    if is_followup and not conversation_id:
+        raise HTTPException(status_code=400, detail="Conversation ID is required for follow-up questions")
+
+    if len(question) > 1000:
+        raise HTTPException(status_code=400, detail="Question too long (max 1000 characters)")
+
+def too_busy(error):
+    """429 response for a request turned away by LLM admission control."""
+    return HTTPException(status_code=429, detail=str(error), headers={"Retry-After": str(error.retry_after)})
+
+# --- Response shaping ---
+# answer: the generated answer; summary: context_summary; retrievals: entities,
+# facts and chunk references; chunks: full chunk text inside retrievals;
+# timings: per-stage timing breakdown
+RESPONSE_FIELDS = ("answer", "summary", "retrievals", "chunks", "timings")
+DEFAULT_FIELDS = frozenset(("answer", "summary", "retrievals", "chunks"))
+
+def parse_include(request):
+    """Fields requested with `include` ("answer,summary" or a list); all but
+    timings when absent, as before field selection existed."""
+    include = request.get("include")
+    if include is None:
+        fields = set(DEFAULT_FIELDS)
+    else:
+        if isinstance(include, str):
+            include = include.split(",")
+        fields = {str(f).strip() for f in include if str(f).strip()}
+        unknown = fields - set(RESPONSE_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown include fields: {', '.join(sorted(unknown))}. "
+                                                        f"Choose from: {', '.join(RESPONSE_FIELDS)}")
+    if request.get("include_timings"):
+        fields.add("timings")
+    return fields
+
+def chunk_refs(retrievals):
+    """Retrievals with each chunk reduced to its id and source; the text is
+    served separately by /chunks/{chunk_id}."""
+    return [
+        {**r, "chunks": [{"chunk_id": c["chunk_id"], "source": c["source"]} for c in r.get("chunks") or []]}
+        for r in retrievals
+    ]
+
+def select_fields(response, retrievals, include, timings=None):
+    if "answer" not in include:
+        response.pop("answer", None)
+    if "summary" in include:
+        response["context_summary"] = build_context_summary(retrievals)
+    if "retrievals" in include:
+        response["retrievals"] = retrievals if "chunks" in include else chunk_refs(retrievals)
+    if "timings" in include:
+        response["timings"] = timings
+    return response
+
+def ndjson_event(event):
+    return json.dumps(event, ensure_ascii=False) + "\n"
+
+async def stream_answer_events(question, retrieve, conversation_id, is_followup=False, include=DEFAULT_FIELDS):
+    """
+    Yield NDJSON events for a streamed answer:
+    `retrieve` is a zero-argument coroutine function returning the retrievals.
+    - metadata: retrievals and context summary, sent before generation starts
+    - token: deduplicated answer text as Ollama produces it
+    - done / error: final timing and status
+    """
+    start_time = time.time()
+    timings = start_request_timings()
+    try:
+        retrievals = await retrieve()
+        conversation_store.save(conversation_id, question, retrievals)
+
+        yield ndjson_event(select_fields({
+            "type": "metadata",
+            "conversation_id": conversation_id,
+            "entities_used": len(retrievals),
+            "is_followup": is_followup
+        }, retrievals, include - {"answer", "timings"}))
+
+        priority = "followup" if is_followup else "chat"
+        async for piece in async_stream_answer_with_graph_rag_llama(question, retrievals, priority=priority):
+            yield ndjson_event({"type": "token", "content": piece})
+
+        elapsed = time.time() - start_time
+        REQUEST_SECONDS.labels(endpoint="/followup/stream" if is_followup else "/chat/stream").observe(elapsed)
+
+        done = {
+            "type": "done",
+            "conversation_id": conversation_id,
+            "processing_time": round(elapsed, 2),
+            "timestamp": datetime.now().isoformat(),
+            "success": True
+        }
+        if "timings" in include:
+            done["timings"] = timings
+        yield ndjson_event(done)
+
+    except Exception as e:
+        print(f"Error streaming answer: {str(e)}")
+        event = {
+            "type": "error",
+            "conversation_id": conversation_id,
+            "timestamp": datetime.now().isoformat(),
+            "success": False,
+            "error": str(e)
+        }
+        if isinstance(e, AdmissionRejected):
+            event["retry_after"] = e.retry_after
+        yield ndjson_event(event)
+
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
+    """503 until startup warm-up has finished, so load balancers skip cold instances."""
+    if not readiness.ready:
+        return ORJSONResponse({"status": "starting", "warmup": readiness.stats()},
+                              status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return {"status": "healthy", "warmup": readiness.stats(), "llm": llm_admission.stats()}
 
 @app.post("/chat")
 async def ask_question(request: Dict[str, Any]):
@@ -40,33 +232,43 @@ async def ask_question(request: Dict[str, Any]):
     - question: str (required) - The user's question
     - conversation_id: str (optional) - For follow-up questions
     - previous_context: list (optional) - Previous conversation context for follow-ups
+    - multihop: bool (optional) - Rank facts within a few hops by personalized PageRank
+    - include: str or list (optional) - Response fields among answer, summary, retrievals,
+      chunks and timings (default: all but timings). Without "chunks", retrievals carry
+      chunk references to be fetched from /chunks/{chunk_id}
+    - include_timings: bool (optional) - Same as adding "timings" to include
+
+    Returns 429 with Retry-After when the LLM queue is full.
     """
     try:
         # Extract question from request
         question = request.get("question", "").strip()
-        if not question:
-            raise HTTPException(status_code=400, detail="Question is required")
-        
-        if len(question) > 1000:
-            raise HTTPException(status_code=400, detail="Question too long (max 1000 characters)")
+        validate_question(question)
         
         # Generate or use conversation ID
         conversation_id = request.get("conversation_id", str(uuid.uuid4()))
         previous_context = request.get("previous_context", [])
         
+        include = parse_include(request)
+
         # Start timing
         start_time = time.time()
+        timings = start_request_timings()
         
         # Retrieve context from knowledge graph
-        retrievals = retrieve_context(question, topk_entities=5)
+        retrievals = await async_cached_retrieve_context(question, topk_entities=5, combined=True,
+                                                         multihop=bool(request.get("multihop", False)))
+        conversation_store.save(conversation_id, question, retrievals)
         
-        # Generate answer using existing function
-        answer = answer_with_graph_rag_llama(question, retrievals)
+        # Generate answer without blocking the event loop
+        answer = await async_answer_with_graph_rag_llama(question, retrievals)
         
         # Calculate processing time
-        processing_time = round(time.time() - start_time, 2)
+        elapsed = time.time() - start_time
+        processing_time = round(elapsed, 2)
+        REQUEST_SECONDS.labels(endpoint="/chat").observe(elapsed)
         
-        # Prepare response (include retrievals for reference UI)
+        # Prepare response; retrievals and summary are added per `include`
         response = {
             "answer": answer,
             "conversation_id": conversation_id,
@@ -74,18 +276,14 @@ async def ask_question(request: Dict[str, Any]):
             "entities_used": len(retrievals),
             "timestamp": datetime.now().isoformat(),
             "success": True,
-            "retrievals": retrievals,
-            "context_summary": {
-                "entities_found": [r.get('entity', 'Unknown') for r in retrievals[:3]],  # Top 3 entities
-                "total_relations": sum(len(r.get('neighbors', [])) for r in retrievals),
-                "total_chunks": sum(len(r.get('chunks', [])) for r in retrievals)
-            }
         }
         
-        return response
+        return select_fields(response, retrievals, include, timings)
         
     except HTTPException:
         raise
+    except AdmissionRejected as e:
+        raise too_busy(e)
     except Exception as e:
         # Log error (in production, use proper logging)
         print(f"Error processing question: {str(e)}")
@@ -110,6 +308,14 @@ async def ask_followup_question(request: Dict[str, Any]):
     - conversation_id: str (required) - Conversation ID from previous interaction
     - previous_answer: str (optional) - Previous answer for context
     - original_question: str (optional) - Original question for context
+      (both only used when the server no longer holds the conversation's context)
+    - multihop: bool (optional) - Rank facts within a few hops by personalized PageRank
+    - include: str or list (optional) - Response fields among answer, summary, retrievals,
+      chunks and timings (default: all but timings). Without "chunks", retrievals carry
+      chunk references to be fetched from /chunks/{chunk_id}
+    - include_timings: bool (optional) - Same as adding "timings" to include
+
+    Returns 429 with Retry-After when the LLM queue is full.
     """
     try:
         # Extract data from request
@@ -118,34 +324,28 @@ async def ask_followup_question(request: Dict[str, Any]):
         previous_answer = request.get("previous_answer", "")
         original_question = request.get("original_question", "")
         
-        if not question:
-            raise HTTPException(status_code=400, detail="Follow-up question is required")
-        
-        if not conversation_id:
-            raise HTTPException(status_code=400, detail="Conversation ID is required for follow-up questions")
-        
-        if len(question) > 1000:
-            raise HTTPException(status_code=400, detail="Question too long (max 1000 characters)")
+        validate_question(question, conversation_id, is_followup=True)
         
+        include = parse_include(request)
+
         # Start timing
         start_time = time.time()
+        timings = start_request_timings()
         
-        # Create context-aware question for better retrieval
-        if original_question and previous_answer:
-            contextual_question = f"Previous question: {original_question}\nPrevious answer: {previous_answer[:200]}...\nFollow-up question: {question}"
-        else:
-            contextual_question = question
-        
-        # Retrieve context from knowledge graph
-        retrievals = retrieve_context(contextual_question, topk_entities=5)
+        # Reuse the previous turn's context, retrieving only newly mentioned entities
+        retrievals = await retrieve_followup_context(question, conversation_id, original_question, previous_answer,
+                                                     multihop=bool(request.get("multihop", False)))
+        conversation_store.save(conversation_id, question, retrievals)
         
-        # Generate answer using existing function
-        answer = answer_with_graph_rag_llama(question, retrievals)
+        # Generate answer without blocking the event loop
+        answer = await async_answer_with_graph_rag_llama(question, retrievals, priority="followup")
         
         # Calculate processing time
-        processing_time = round(time.time() - start_time, 2)
+        elapsed = time.time() - start_time
+        processing_time = round(elapsed, 2)
+        REQUEST_SECONDS.labels(endpoint="/followup").observe(elapsed)
         
-        # Prepare response (include retrievals for reference UI)
+        # Prepare response; retrievals and summary are added per `include`
         response = {
             "answer": answer,
             "conversation_id": conversation_id,
@@ -154,18 +354,14 @@ async def ask_followup_question(request: Dict[str, Any]):
             "timestamp": datetime.now().isoformat(),
             "success": True,
             "is_followup": True,
-            "retrievals": retrievals,
-            "context_summary": {
-                "entities_found": [r.get('entity', 'Unknown') for r in retrievals[:3]],
-                "total_relations": sum(len(r.get('neighbors', [])) for r in retrievals),
-                "total_chunks": sum(len(r.get('chunks', [])) for r in retrievals)
-            }
         }
         
-        return response
+        return select_fields(response, retrievals, include, timings)
         
     except HTTPException:
         raise
+    except AdmissionRejected as e:
+        raise too_busy(e)
     except Exception as e:
         # Log error (in production, use proper logging)
         print(f"Error processing follow-up question: {str(e)}")
@@ -181,6 +377,208 @@ async def ask_followup_question(request: Dict[str, Any]):
             "error": str(e)
         }
 
+@app.post("/chat/stream")
+async def ask_question_stream(request: Dict[str, Any]):
+    """
+    Streaming variant of /chat. Responds with NDJSON: a metadata event with
+    the retrievals first, then token events as the answer is generated.
+    Returns 429 with Retry-After up front when the LLM queue is full.
+    """
+    question = request.get("question", "").strip()
+    validate_question(question)
+    conversation_id = request.get("conversation_id", str(uuid.uuid4()))
+    try:
+        llm_admission.check()
+    except AdmissionRejected as e:
+        raise too_busy(e)
+
+    multihop = bool(request.get("multihop", False))
+
+    async def retrieve():
+        return await async_cached_retrieve_context(question, topk_entities=5, combined=True, multihop=multihop)
+
+    return StreamingResponse(
+        stream_answer_events(question, retrieve, conversation_id,
+                             include=parse_include(request)),
+        media_type="application/x-ndjson"
+    )
+
+@app.post("/followup/stream")
+async def ask_followup_question_stream(request: Dict[str, Any]):
+    """
+    Streaming variant of /followup. Same request body, NDJSON response.
+    """
+    question = request.get("question", "").strip()
+    conversation_id = request.get("conversation_id", "")
+    validate_question(question, conversation_id, is_followup=True)
+    try:
+        llm_admission.check()
+    except AdmissionRejected as e:
+        raise too_busy(e)
+
+    async def retrieve():
+        return await retrieve_followup_context(
+            question, conversation_id, request.get("original_question", ""), request.get("previous_answer", ""),
+            multihop=bool(request.get("multihop", False))
+        )
+
+    return StreamingResponse(
+        stream_answer_events(question, retrieve, conversation_id, is_followup=True,
+                             include=parse_include(request)),
+        media_type="application/x-ndjson"
+    )
+
+async def batch_answer_events(questions, include_retrievals=False):
+    """
+    Yield NDJSON events for a batch of questions:
+    - metadata: batch size and number of distinct entities fetched
+    - result: one per question, in completion order, tagged with its index
+    - done / error: totals and timing
+    """
+    start_time = time.time()
+    valid = [i for i, q in enumerate(questions) if q and len(q) <= 1000]
+    failed = {}
+    try:
+        retrievals = await async_batch_retrieve_context([questions[i] for i in valid], topk_entities=5)
+    except Exception as e:
+        # One bad question (e.g. unbalanced quotes in the fulltext query) fails
+        # the shared statement; retrieve per question so only that one fails
+        print(f"Batch retrieval failed, retrieving per question: {str(e)}")
+        results = await asyncio.gather(
+            *(async_cached_retrieve_context(questions[i], topk_entities=5, combined=True) for i in valid),
+            return_exceptions=True
+        )
+        failed = {i: r for i, r in zip(valid, results) if isinstance(r, Exception)}
+        retrievals = [r for r in results if not isinstance(r, Exception)]
+        valid = [i for i in valid if i not in failed]
+
+    yield ndjson_event({
+        "type": "metadata",
+        "questions": len(questions),
+        "distinct_entities": len({r["entity"] for rs in retrievals for r in rs})
+    })
+
+    for i in sorted(set(range(len(questions))) - set(valid)):
+        if i in failed:
+            error = f"Retrieval failed: {failed[i]}"
+        else:
+            error = "Question is required" if not questions[i] else "Question too long (max 1000 characters)"
+        yield ndjson_event({"type": "result", "index": i, "question": questions[i], "success": False, "error": error})
+
+    # Generations run BATCH_CONCURRENCY at a time at the lowest LLM priority,
+    # so a large batch neither floods the admission queue nor starves /chat
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def answer(index, question_retrievals):
+        async with semaphore:
+            question_start = time.time()
+            event = {"type": "result", "index": index, "question": questions[index]}
+            try:
+                event["answer"] = await async_answer_with_graph_rag_llama(questions[index], question_retrievals,
+                                                                          priority="batch")
+                event["success"] = True
+            except Exception as e:
+                event.update(success=False, error=str(e))
+                if isinstance(e, AdmissionRejected):
+                    event["retry_after"] = e.retry_after
+            event["entities_used"] = len(question_retrievals)
+            event["processing_time"] = round(time.time() - question_start, 2)
+            if include_retrievals:
+                event["retrievals"] = question_retrievals
+            return event
+
+    tasks = [asyncio.ensure_future(answer(i, r)) for i, r in zip(valid, retrievals)]
+    succeeded = 0
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            event = await next_result
+            succeeded += event["success"]
+            yield ndjson_event(event)
+    finally:
+        # Client went away: stop generating for it
+        for task in tasks:
+            task.cancel()
+
+    elapsed = time.time() - start_time
+    REQUEST_SECONDS.labels(endpoint="/chat/batch").observe(elapsed)
+    yield ndjson_event({
+        "type": "done",
+        "questions": len(questions),
+        "succeeded": succeeded,
+        "processing_time": round(elapsed, 2),
+        "timestamp": datetime.now().isoformat(),
+        "success": True
+    })
+
+@app.post("/chat/batch")
+async def ask_questions_batch(request: Dict[str, Any]):
+    """
+    Answer many questions in one call. Entity search runs for all questions
+    together and each distinct entity is expanded once across the batch;
+    answers are generated with bounded concurrency and streamed back as
+    NDJSON result events as each one completes.
+
+    Request body should contain:
+    - questions: list[str] (required) - At most GRAPH_RAG_MAX_BATCH questions
+    - include_retrievals: bool (optional) - Add each question's retrievals to its result
+    """
+    questions = request.get("questions")
+    if not isinstance(questions, list) or not questions:
+        raise HTTPException(status_code=400, detail="questions must be a non-empty list")
+    if len(questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"Too many questions (max {MAX_BATCH_QUESTIONS})")
+
+    questions = [str(q or "").strip() for q in questions]
+    return StreamingResponse(
+        batch_answer_events(questions, include_retrievals=bool(request.get("include_retrievals", False))),
+        media_type="application/x-ndjson"
+    )
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an ETag against an If-None-Match header (RFC 9110 13.1.2)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in tags)
+
+# Chunk ids written by pipeline.py are derived from content, so their text never changes
+CONTENT_ADDRESSED_CHUNK_ID = re.compile(r"^chunk_[0-9a-f]{16}$")
+
+@app.get("/chunks/{chunk_id}")
+async def get_chunk(chunk_id: str, request: Request):
+    """Text and source of one chunk, with an ETag for conditional requests."""
+    chunk = await async_get_chunk(chunk_id)
+    if chunk is None:
+        raise HTTPException(status_code=404, detail=f"Chunk {chunk_id} not found")
+
+    etag = '"' + hashlib.sha256(f"{chunk['source']}\n{chunk['text']}".encode("utf-8")).hexdigest()[:32] + '"'
+    if CONTENT_ADDRESSED_CHUNK_ID.match(chunk_id):
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        # Sequential ids from create_chunks.py can be reassigned by a rebuild
+        cache_control = "public, max-age=3600"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return ORJSONResponse(chunk, headers=headers)
+
+@app.get("/metrics")
+def prometheus_metrics():
+    payload, content_type = metrics_payload()
+    return Response(content=payload, media_type=content_type)
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {
+        "retrieval": retrieval_cache.stats(),
+        "answers": answer_cache.stats(),
+        "conversations": conversation_store.stats(),
+        "in_flight": {"retrieval": retrieval_flights.stats(), "answers": answer_flights.stats()}
+    }
+
 @app.get("/")
 def root():
     return {
@@ -190,6 +588,12 @@ def root():
             "health": "/health",
             "chat": "/chat (POST)",
             "followup": "/followup (POST)",
+            "chat_stream": "/chat/stream (POST, NDJSON)",
+            "followup_stream": "/followup/stream (POST, NDJSON)",
+            "chat_batch": "/chat/batch (POST, NDJSON)",
+            "chunk": "/chunks/{chunk_id}",
+            "cache_stats": "/cache/stats",
+            "metrics": "/metrics",
             "docs": "/docs"
         }
     }
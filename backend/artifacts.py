@@ -0,0 +1,181 @@
+"""
+Storage for pipeline intermediates (extracted pages, grouped documents,
+chunks and triplets).
+
+Artifacts are gzip-compressed UTF-8 JSON Lines, one record per line, so
+they can be streamed in and out without holding the whole document in
+memory. Records are compressed in blocks of `BLOCK_RECORDS` as separate
+gzip members, which standard gzip tools read as one stream; when written
+with a `key`, a sidecar `.idx` file maps each key (e.g. chunk id) to its
+block offset and row so single records can be read without
+decompressing the file.
+
+Paths are given as the legacy `.json` names; the compact file lives next
+to it as `.jsonl.gz`. Readers fall back to the legacy pretty-printed
+UTF-16 JSON when no compact file exists yet.
+
+Convert existing artifacts once with:
+    python artifacts.py --convert
+"""
+import os
+import sys
+import gzip
+import json
+import glob
+import argparse
+
+BLOCK_RECORDS = 256
+COMPACT_SUFFIX = ".jsonl.gz"
+INDEX_SUFFIX = ".idx"
+
+ARTIFACT_KEYS = {
+    "./essentials/all_chunks.json": "id",
+    "./essentials/knowledge_triplets.json": "triplet_id",
+}
+
+
+def compact_path(path):
+    """`.jsonl.gz` path for a legacy `.json` artifact path."""
+    if path.endswith(COMPACT_SUFFIX):
+        return path
+    return (path[:-len(".json")] if path.endswith(".json") else path) + COMPACT_SUFFIX
+
+def legacy_path(path):
+    return path[:-len(COMPACT_SUFFIX)] + ".json" if path.endswith(COMPACT_SUFFIX) else path
+
+def resolve(path):
+    """The file actually backing an artifact: compact if present, else legacy."""
+    compact = compact_path(path)
+    return compact if os.path.exists(compact) else legacy_path(path)
+
+
+# --- Reading ---
+def iter_records(path):
+    """Stream records from an artifact, compact or legacy."""
+    compact = compact_path(path)
+    if os.path.exists(compact):
+        with gzip.open(compact, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    with open(legacy_path(path), "r", encoding="utf-16") as f:
+        yield from json.load(f)
+
+def load_records(path, default=None):
+    try:
+        return list(iter_records(path))
+    except FileNotFoundError:
+        if default is None:
+            raise
+        return default
+
+
+# --- Writing ---
+def write_records(path, records, key=None):
+    """
+    Stream records into the compact artifact for `path`, replacing it
+    atomically. With `key`, also write the sidecar index. Returns the
+    number of records written.
+    """
+    target = compact_path(path)
+    tmp = target + ".tmp"
+    index, block, offset, count = {}, [], 0, 0
+
+    with open(tmp, "wb") as out:
+        def flush_block():
+            nonlocal offset
+            if not block:
+                return
+            data = gzip.compress("".join(block).encode("utf-8"), compresslevel=6)
+            out.write(data)
+            offset += len(data)
+            block.clear()
+
+        for record in records:
+            if key is not None:
+                index[record[key]] = [offset, len(block)]
+            block.append(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+            if len(block) >= BLOCK_RECORDS:
+                flush_block()
+        flush_block()
+
+    # Drop the old index first, so a crash before the new one lands leaves
+    # no index rather than one pointing at the wrong offsets
+    if os.path.exists(target + INDEX_SUFFIX):
+        os.remove(target + INDEX_SUFFIX)
+    os.replace(tmp, target)
+    if key is not None:
+        with open(target + INDEX_SUFFIX + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"key": key, "size": offset, "records": index}, f)
+        os.replace(target + INDEX_SUFFIX + ".tmp", target + INDEX_SUFFIX)
+    return count
+
+
+class ArtifactIndex:
+    """
+    Random access to single records of a compact artifact by key.
+    Raises FileNotFoundError without an index and ValueError when the index
+    does not match the data file (e.g. one left by an interrupted write).
+    """
+
+    def __init__(self, path):
+        self.path = compact_path(path)
+        with open(self.path + INDEX_SUFFIX, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if os.path.getsize(self.path) != meta["size"]:
+            raise ValueError(f"Stale index for {self.path}")
+        self.key = meta["key"]
+        self.records = meta["records"]
+        offsets = sorted({offset for offset, _ in self.records.values()})
+        self._block_end = dict(zip(offsets, offsets[1:] + [meta["size"]]))
+        self._cached_block = (None, None)
+
+    def __contains__(self, key):
+        return key in self.records
+
+    def get(self, key, default=None):
+        location = self.records.get(key)
+        if location is None:
+            return default
+        offset, row = location
+        return json.loads(self._read_block(offset)[row])
+
+    def _read_block(self, offset):
+        if self._cached_block[0] != offset:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                data = f.read(self._block_end[offset] - offset)
+            self._cached_block = (offset, gzip.decompress(data).decode("utf-8").splitlines())
+        return self._cached_block[1]
+
+
+# --- One-shot conversion of legacy artifacts ---
+def convert(path, key=None, remove=False):
+    records = load_records(legacy_path(path))
+    count = write_records(path, records, key=key)
+    before, after = os.path.getsize(legacy_path(path)), os.path.getsize(compact_path(path))
+    print(f"✅ {os.path.basename(path)}: {count} records, {before / 1024:.0f} KB -> {after / 1024:.0f} KB")
+    if remove:
+        os.remove(legacy_path(path))
+
+def legacy_artifacts():
+    paths = ["./essentials/group_chunks.json", *ARTIFACT_KEYS]
+    paths += sorted(glob.glob("./data/extracted_pdfs/*.json"))
+    return [p for p in paths if os.path.exists(p)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert pipeline artifacts to compressed JSON Lines")
+    parser.add_argument("--convert", action="store_true", help="convert every legacy UTF-16 JSON artifact")
+    parser.add_argument("--remove", action="store_true", help="delete the legacy files after converting")
+    args = parser.parse_args()
+
+    if not args.convert:
+        parser.print_help()
+        sys.exit(0)
+
+    for path in legacy_artifacts():
+        convert(path, key=ARTIFACT_KEYS.get(path), remove=args.remove)
@@ -0,0 +1,213 @@
+"""
+Offline stand-ins for Neo4j and Ollama used by the benchmark suite.
+
+The fake drivers answer the queries in retrieval_mechs.py from the in-memory
+graph (graph_engine.CSRGraph) after a configurable per-query latency, so
+the app's real retrieval code paths and round-trip counts are exercised.
+The fake Ollama client sleeps for a prefill time proportional to the
+prompt size and then emits tokens at a fixed rate.
+"""
+import time
+import random
+import asyncio
+from collections import defaultdict
+
+import retrieval_mechs
+
+
+class StageTimings:
+    """Collects raw durations (seconds) per named stage."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def record(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    def clear(self):
+        self.samples.clear()
+
+
+class Latency:
+    def __init__(self, mean_ms=2.0, jitter_ms=0.5):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+
+    def sample(self):
+        return max(0.0, random.gauss(self.mean_ms, self.jitter_ms)) / 1000
+
+
+# --- Neo4j ---
+def answer_query(graph, query, params):
+    """Evaluate one of retrieval_mechs' Cypher queries against the in-memory graph."""
+    if query == retrieval_mechs.SEARCH_ENTITIES_QUERY:
+        return graph.search_entities(params["q"], limit=params["limit"])
+    if query == retrieval_mechs.EXPAND_ENTITY_QUERY:
+        return graph.expand_entity(params["entity"], limit=params["limit"])
+    if query == retrieval_mechs.ENTITY_CHUNKS_QUERY:
+        return graph.get_chunks_for_entity(params["entity"], limit=params["limit"])
+    if query == retrieval_mechs.COMBINED_RETRIEVAL_QUERY:
+        return [
+            {
+                "entity": ent["entity"],
+                "neighbors": graph.expand_entity(ent["entity"], limit=params["neighbor_limit"]),
+                "chunks": graph.get_chunks_for_entity(ent["entity"], limit=params["chunk_limit"])
+            }
+            for ent in graph.search_entities(params["q"], limit=params["limit"])
+        ]
+    if query == retrieval_mechs.GRAPH_VERSION_QUERY:
+        return [{"version": graph.version}]
+    return []
+
+
+class FakeRecord:
+    def __init__(self, data):
+        self._data = data
+
+    def data(self):
+        return dict(self._data)
+
+    def values(self):
+        return list(self._data.values())
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self._rows = [FakeRecord(r) for r in rows]
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def single(self):
+        return self._rows[0] if self._rows else None
+
+    def consume(self):
+        return None
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        start = time.perf_counter()
+        time.sleep(self.driver.latency.sample())
+        rows = answer_query(self.driver.graph, query, params)
+        self.driver.timings.record("neo4j_query", time.perf_counter() - start)
+        return FakeResult(rows)
+
+
+class FakeDriver:
+    def __init__(self, graph, latency, timings):
+        self.graph = graph
+        self.latency = latency
+        self.timings = timings
+
+    def session(self, **kwargs):
+        return FakeSession(self)
+
+
+class FakeAsyncResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    async def data(self):
+        return [dict(r) for r in self._rows]
+
+    async def single(self):
+        return FakeRecord(self._rows[0]) if self._rows else None
+
+
+class FakeAsyncSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def run(self, query, **params):
+        start = time.perf_counter()
+        await asyncio.sleep(self.driver.latency.sample())
+        rows = answer_query(self.driver.graph, query, params)
+        self.driver.timings.record("neo4j_query", time.perf_counter() - start)
+        return FakeAsyncResult(rows)
+
+
+class FakeAsyncDriver(FakeDriver):
+    def session(self, **kwargs):
+        return FakeAsyncSession(self)
+
+
+# --- Ollama ---
+class FakeOllama:
+    """
+    Simulates generation: a prefill delay of `prefill_ms` plus
+    `prefill_ms_per_kchar` per 1000 prompt characters, then `answer_tokens`
+    tokens emitted at `tokens_per_sec`.
+    """
+
+    def __init__(self, timings, prefill_ms=200.0, prefill_ms_per_kchar=50.0,
+                 tokens_per_sec=200.0, answer_tokens=120):
+        self.timings = timings
+        self.prefill_ms = prefill_ms
+        self.prefill_ms_per_kchar = prefill_ms_per_kchar
+        self.tokens_per_sec = tokens_per_sec
+        self.answer_tokens = answer_tokens
+
+    def prefill_seconds(self, messages):
+        chars = sum(len(m["content"]) for m in messages)
+        return (self.prefill_ms + self.prefill_ms_per_kchar * chars / 1000) / 1000
+
+    def tokens(self):
+        return [f"token{i}{chr(10) if i % 20 == 19 else ' '}" for i in range(self.answer_tokens)]
+
+    # Synchronous ollama.chat replacement
+    def chat(self, model, messages, options=None, stream=False, **kwargs):
+        start = time.perf_counter()
+        time.sleep(self.prefill_seconds(messages))
+        self.timings.record("llm_ttft", time.perf_counter() - start)
+        tokens = self.tokens()
+        time.sleep(len(tokens) / self.tokens_per_sec)
+        self.timings.record("llm_total", time.perf_counter() - start)
+        return {"message": {"content": "".join(tokens)}}
+
+    def async_client(self):
+        return FakeAsyncOllamaClient(self)
+
+
+class FakeAsyncOllamaClient:
+    def __init__(self, fake):
+        self.fake = fake
+
+    async def chat(self, model, messages, options=None, stream=False, **kwargs):
+        if stream:
+            return self._stream(messages)
+
+        start = time.perf_counter()
+        await asyncio.sleep(self.fake.prefill_seconds(messages))
+        self.fake.timings.record("llm_ttft", time.perf_counter() - start)
+        tokens = self.fake.tokens()
+        await asyncio.sleep(len(tokens) / self.fake.tokens_per_sec)
+        self.fake.timings.record("llm_total", time.perf_counter() - start)
+        return {"message": {"content": "".join(tokens)}}
+
+    async def _stream(self, messages):
+        start = time.perf_counter()
+        await asyncio.sleep(self.fake.prefill_seconds(messages))
+        self.fake.timings.record("llm_ttft", time.perf_counter() - start)
+        for token in self.fake.tokens():
+            await asyncio.sleep(1 / self.fake.tokens_per_sec)
+            yield {"message": {"content": token}}
+        self.fake.timings.record("llm_total", time.perf_counter() - start)
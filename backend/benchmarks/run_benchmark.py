@@ -0,0 +1,236 @@
+"""
+End-to-end load benchmark for the FastAPI app, fully offline.
+
+Neo4j and Ollama are replaced by the stand-ins in benchmarks/fakes.py with
+configurable latency and token rate; everything between them (retrieval
+code, caching, prompt building, answer cleanup, HTTP handling) is the real
+app running in-process over httpx's ASGI transport.
+
+Usage (from the backend directory):
+    python -m benchmarks.run_benchmark --mode closed --concurrency 1 4 16
+    python -m benchmarks.run_benchmark --mode open --rates 2 8 --duration 20
+
+Results are printed and saved as JSON under benchmarks/results/ so runs
+from different versions can be compared.
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+
+import numpy as np
+import httpx
+
+import app
+import run_query
+import retrieval_mechs
+import graph_engine
+from retrieval_cache import RetrievalCache
+from singleflight import SingleFlight
+from benchmarks.fakes import StageTimings, Latency, FakeDriver, FakeAsyncDriver, FakeOllama
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+QUESTIONS_PATH = os.path.join(BENCHMARK_DIR, "questions.json")
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+
+with open(QUESTIONS_PATH, "r", encoding="utf-8") as f:
+    QUESTIONS = json.load(f)
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    values = np.asarray(samples) * 1000
+    return {
+        "count": int(values.size),
+        "mean_ms": round(float(values.mean()), 2),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2)
+    }
+
+
+def install_fakes(args, timings):
+    """Point the app at the fake Neo4j and Ollama backends."""
+    graph = graph_engine.CSRGraph.from_artifacts()
+    latency = Latency(args.neo4j_latency_ms, args.neo4j_jitter_ms)
+    retrieval_mechs.driver = FakeDriver(graph, latency, timings)
+    retrieval_mechs.async_driver = FakeAsyncDriver(graph, latency, timings)
+
+    fake_ollama = FakeOllama(timings, prefill_ms=args.prefill_ms, prefill_ms_per_kchar=args.prefill_ms_per_kchar,
+                             tokens_per_sec=args.tokens_per_sec, answer_tokens=args.answer_tokens)
+    run_query.ollama.chat = fake_ollama.chat
+    run_query.async_client = fake_ollama.async_client()
+
+    # Time the retrieval stage as the endpoints see it
+    retrieve = retrieval_mechs.async_retrieve_context if args.no_cache else retrieval_mechs.async_cached_retrieve_context
+
+    app.async_cached_retrieve_context = timed_stage(retrieve, timings)
+    # Follow-ups with stored conversation state skip the cached retrieval
+    app.async_followup_retrieve_context = timed_stage(retrieval_mechs.async_followup_retrieve_context, timings)
+
+
+def timed_stage(retrieve, timings):
+    """`retrieve` recording its duration as the retrieval stage."""
+    async def timed_retrieve(*a, **kw):
+        start = time.perf_counter()
+        try:
+            return await retrieve(*a, **kw)
+        finally:
+            timings.record("retrieval", time.perf_counter() - start)
+    return timed_retrieve
+
+
+def reset_state():
+    retrieval_mechs.retrieval_cache = RetrievalCache()
+    app.retrieval_cache = retrieval_mechs.retrieval_cache
+    # Otherwise every level after the first only measures answer cache hits
+    run_query.answer_cache.clear()
+    run_query.answer_flights = SingleFlight()
+    app.answer_flights = run_query.answer_flights
+    app.conversation_store.clear()
+
+
+def make_request(endpoint, question, rng):
+    if endpoint == "/followup":
+        return {
+            "question": question,
+            "conversation_id": f"bench-{rng.randrange(1 << 30)}",
+            "original_question": rng.choice(QUESTIONS),
+            "previous_answer": "A previous answer about the device and its measurements."
+        }
+    return {"question": question}
+
+
+async def send(client, endpoint, question, rng, timings, errors):
+    start = time.perf_counter()
+    try:
+        response = await client.post(endpoint, json=make_request(endpoint, question, rng), timeout=None)
+        if response.status_code != 200 or not response.json().get("success", False):
+            errors.append(response.status_code)
+    except Exception as e:
+        errors.append(str(e))
+    finally:
+        timings.record("end_to_end", time.perf_counter() - start)
+
+
+async def closed_loop(client, endpoint, concurrency, total_requests, rng, timings, errors):
+    """`concurrency` clients, each sending its next request as soon as the previous one returns."""
+    counter = iter(range(total_requests))
+
+    async def user():
+        for i in counter:
+            await send(client, endpoint, QUESTIONS[i % len(QUESTIONS)], rng, timings, errors)
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+
+
+async def open_loop(client, endpoint, rate, duration, rng, timings, errors):
+    """Poisson arrivals at `rate` req/s for `duration` seconds, independent of response times."""
+    tasks = []
+    deadline = time.perf_counter() + duration
+    i = 0
+    while time.perf_counter() < deadline:
+        tasks.append(asyncio.create_task(send(client, endpoint, QUESTIONS[i % len(QUESTIONS)], rng, timings, errors)))
+        i += 1
+        await asyncio.sleep(rng.expovariate(rate))
+    await asyncio.gather(*tasks)
+
+
+async def run_level(args, endpoint, level, timings):
+    reset_state()
+    timings.clear()
+    errors = []
+    rng = random.Random(args.seed)
+
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        start = time.perf_counter()
+        if args.mode == "closed":
+            await closed_loop(client, endpoint, level, args.requests, rng, timings, errors)
+        else:
+            await open_loop(client, endpoint, level, args.duration, rng, timings, errors)
+        elapsed = time.perf_counter() - start
+
+    completed = len(timings.samples["end_to_end"])
+    return {
+        "endpoint": endpoint,
+        "mode": args.mode,
+        "concurrency" if args.mode == "closed" else "rate_rps": level,
+        "requests": completed,
+        "errors": len(errors),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(completed / elapsed, 2) if elapsed > 0 else None,
+        "stages": {stage: percentiles(samples) for stage, samples in sorted(timings.samples.items())}
+    }
+
+
+def print_level(result):
+    level_key = "concurrency" if result["mode"] == "closed" else "rate_rps"
+    print(f"\n📊 {result['endpoint']} {result['mode']}-loop {level_key}={result[level_key]}: "
+          f"{result['requests']} requests, {result['errors']} errors, {result['throughput_rps']} req/s")
+    print(f"  {'stage':<14}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, stats in result["stages"].items():
+        if stats:
+            print(f"  {stage:<14}{stats['count']:>8}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+async def main(args):
+    timings = StageTimings()
+    install_fakes(args, timings)
+
+    levels = args.concurrency if args.mode == "closed" else args.rates
+    results = []
+    for endpoint in args.endpoints:
+        for level in levels:
+            result = await run_level(args, endpoint, level, timings)
+            print_level(result)
+            results.append(result)
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "results": results
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output_path = args.output or os.path.join(RESULTS_DIR, f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Results saved to {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark for /chat and /followup")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--endpoints", nargs="+", default=["/chat", "/followup"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16], help="closed-loop client counts")
+    parser.add_argument("--requests", type=int, default=100, help="requests per closed-loop level")
+    parser.add_argument("--rates", nargs="+", type=float, default=[2.0, 8.0], help="open-loop arrival rates (req/s)")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per open-loop level")
+    parser.add_argument("--neo4j-latency-ms", type=float, default=2.0)
+    parser.add_argument("--neo4j-jitter-ms", type=float, default=0.5)
+    parser.add_argument("--prefill-ms", type=float, default=200.0)
+    parser.add_argument("--prefill-ms-per-kchar", type=float, default=50.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--no-cache", action="store_true", help="bypass the retrieval cache")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="path for the JSON report")
+    args = parser.parse_args()
+
+    asyncio.run(main(args))
@@ -0,0 +1,230 @@
+"""
+Offline entity canonicalization.
+
+The LLM emits the same concept under several surface forms ("Central
+apnea", "central apneas", "pulse wave velocity (PWV)"), and the loaders
+MERGE Entity nodes on the raw name, so each form becomes its own node.
+This pass groups those forms and writes an alias map (alias -> canonical
+name) that db_creation.py, pipeline.py and the in-memory graph apply when
+loading triplets; the loaders also fold Entity nodes already stored under
+an alias into the canonical node.
+
+Candidates are blocked in two cheap, sub-quadratic steps:
+
+- exact match on a normalized key (case, accents, punctuation, plural
+  endings and parenthesized abbreviations of the preceding words removed)
+- MinHash LSH over character trigrams of the keys, which only compares
+  keys sharing a band; candidate pairs are then confirmed on their exact
+  trigram Jaccard similarity
+
+Both steps also require the same numbers, comparison operators, signs and
+percentages, taken from the raw name ("< 0.01" != "0.01", "type 1" !=
+"type 2"), and purely numeric or statistical names are never merged.
+
+Groups are formed with union-find and named after their most frequent
+surface form.
+"""
+import re
+import json
+import zlib
+import argparse
+from collections import Counter, defaultdict
+import numpy as np
+from unidecode import unidecode
+from artifacts import iter_records
+
+TRIPLETS_PATH = "./essentials/knowledge_triplets.json"
+ALIASES_PATH = "./essentials/entity_aliases.json"
+
+NUM_PERM = 64
+BANDS = 16
+SIMILARITY = 0.9
+MERSENNE_PRIME = (1 << 61) - 1
+
+PARENTHESIZED = re.compile(r"\s*\(\s*([^\s()]+)\s*\)")
+NON_WORD = re.compile(r"[^\w\s]")
+WORD_SPLIT = re.compile(r"[\s\-/]+")
+# Numbers, comparison operators, signs and percent: "< 0.01", ">=5", "+-3", "18%"
+SIGNATURE = re.compile(r"[<>]=?|=|\+-|\+|%|/|(?<![A-Za-z])-(?=\s*\d)|\d+(?:[.,]\d+)?")
+ALPHA_WORD = re.compile(r"[a-z]{3,}")
+
+
+# --- Normalized keys ---
+def singular(token):
+    if len(token) <= 3 or token.endswith(("ss", "us", "is")):
+        return token
+    if token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith(("ches", "shes", "xes", "sses")):
+        return token[:-2]
+    if token.endswith("s"):
+        return token[:-1]
+    return token
+
+def is_abbreviation(abbreviation, preceding):
+    """Whether a parenthesized word abbreviates the words before it, as in
+    "pulse wave velocity (PWV)" or "lower-body negative pressure (LBNP)"."""
+    letters = abbreviation.lower().removesuffix("s")
+    if len(letters) < 2 or not letters.isalpha():
+        return False
+    words = [w for w in WORD_SPLIT.split(preceding.lower()) if w]
+    initials = "".join(w[0] for w in words[-len(letters):])
+    return len(words) >= len(letters) and initials == letters
+
+def strip_abbreviations(text):
+    def replace(match):
+        return "" if is_abbreviation(match.group(1), text[:match.start()]) else match.group(0)
+    return PARENTHESIZED.sub(replace, text)
+
+def signature(name):
+    """Numbers, operators, signs and percent in a name, in order; names that
+    differ here ("< 0.01" vs "0.01", "type 2 (18%)" vs "type 2 (20%)") are
+    never merged."""
+    return tuple(SIGNATURE.findall(strip_abbreviations(unidecode(name))))
+
+def normalize_entity(name):
+    """Key shared by trivially different surface forms of an entity name.
+    Returns None for purely numeric or statistical names, which are left alone."""
+    text = strip_abbreviations(unidecode(name)).lower()
+    text = NON_WORD.sub(" ", text).replace("_", " ")
+    if not ALPHA_WORD.search(text):
+        return None
+    return " ".join(singular(token) for token in text.split())
+
+
+# --- MinHash LSH ---
+def shingles(key, n=3):
+    padded = f" {key} "
+    return {padded[i:i + n] for i in range(max(len(padded) - n + 1, 1))}
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+def minhash_signatures(shingle_sets, num_perm=NUM_PERM, seed=1):
+    """One row of `num_perm` minimum hashes per shingle set."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    signatures = np.empty((len(shingle_sets), num_perm), dtype=np.uint64)
+    for row, shingle_set in enumerate(shingle_sets):
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingle_set),
+                             dtype=np.uint64, count=len(shingle_set))
+        # (a * h + b) mod p, for every shingle and permutation at once
+        signatures[row] = ((np.outer(hashes, a) + b) % MERSENNE_PRIME).min(axis=0)
+    return signatures
+
+def lsh_candidate_pairs(signatures, bands=BANDS):
+    """Pairs of rows whose signatures agree on at least one band."""
+    rows_per_band = signatures.shape[1] // bands
+    pairs = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        block = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        for row, values in enumerate(map(bytes, block)):
+            buckets[values].append(row)
+        for members in buckets.values():
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    pairs.add((members[i], members[j]))
+    return pairs
+
+
+# --- Grouping ---
+class UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, x):
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, x, y):
+        self.parent[self.find(x)] = self.find(y)
+
+
+def canonicalize(name_counts, similarity=SIMILARITY, bands=BANDS):
+    """
+    Group entity names into near-duplicate sets.
+    name_counts: {name: number of triplets mentioning it}
+    Returns: {alias: canonical name} for every name that is not its own canonical
+    """
+    # Exact groups share both the normalized key and the numeric signature
+    names_by_key = defaultdict(list)
+    for name in name_counts:
+        key = normalize_entity(name)
+        if key is not None:
+            names_by_key[(key, signature(name))].append(name)
+    keys = list(names_by_key)
+
+    key_shingles = [shingles(key) for key, _ in keys]
+    uf = UnionFind(len(keys))
+    for i, j in lsh_candidate_pairs(minhash_signatures(key_shingles), bands=bands):
+        if keys[i][1] == keys[j][1] and jaccard(key_shingles[i], key_shingles[j]) >= similarity:
+            uf.union(i, j)
+
+    groups = defaultdict(list)
+    for i, key in enumerate(keys):
+        groups[uf.find(i)].extend(names_by_key[key])
+
+    aliases = {}
+    for names in groups.values():
+        if len(names) < 2:
+            continue
+        canonical = min(names, key=lambda n: (-name_counts[n], len(n), n))
+        aliases.update({name: canonical for name in names if name != canonical})
+    return aliases
+
+
+# --- Applying the alias map ---
+def load_aliases(path=ALIASES_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def apply_aliases(triplets, aliases):
+    """Triplets with subjects and objects replaced by their canonical names,
+    dropping the self-loops a merge can create."""
+    if not aliases:
+        return list(triplets)
+    canonical = []
+    for t in triplets:
+        subject, obj = aliases.get(t["subject"], t["subject"]), aliases.get(t["object"], t["object"])
+        if subject != obj:
+            canonical.append({**t, "subject": subject, "object": obj})
+    return canonical
+
+def alias_rows(aliases):
+    """Rows for db_creation.BULK_ALIASES_QUERY: each canonical name with its aliases."""
+    by_canonical = defaultdict(list)
+    for alias, canonical in aliases.items():
+        by_canonical[canonical].append(alias)
+    return [{"name": name, "aliases": sorted(names)} for name, names in by_canonical.items()]
+
+def merge_rows(aliases):
+    """Rows for db_creation.MERGE_ALIAS_NODES_QUERY."""
+    return [{"alias": alias, "canonical": canonical} for alias, canonical in sorted(aliases.items())]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collapse near-duplicate entity names into canonical entities")
+    parser.add_argument("--similarity", type=float, default=SIMILARITY, help="minimum trigram Jaccard similarity")
+    parser.add_argument("--output", default=ALIASES_PATH, help="alias map to write")
+    args = parser.parse_args()
+
+    name_counts = Counter()
+    for t in iter_records(TRIPLETS_PATH):
+        name_counts[t["subject"]] += 1
+        name_counts[t["object"]] += 1
+
+    aliases = canonicalize(name_counts, similarity=args.similarity)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(aliases, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+    canonical_count = len(name_counts) - len(aliases)
+    print(f"✅ {len(name_counts)} entity names -> {canonical_count} entities "
+          f"({len(aliases)} aliases) saved to {args.output}")
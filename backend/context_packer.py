@@ -0,0 +1,158 @@
+"""
+Token-budgeted packing of retrieval results into LLM context.
+
+Retrieval returns facts and chunks per entity, and co-occurring entities
+often share the same chunks. The packer deduplicates chunks (by chunk id)
+and triplets (by subject, relation, object) across entities, scores each
+against the question with an IDF-weighted term overlap, and fills a token
+budget in relevance order. Prompt length drives llama3 prefill time, so
+the budget bounds latency as well as context size.
+"""
+import os
+import re
+import math
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("GRAPH_RAG_CONTEXT_TOKENS", 1200))
+CHARS_PER_TOKEN = 4
+MIN_CHUNK_TOKENS = 48
+
+TOKEN_PATTERN = re.compile(r"\w+")
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how in is it its of on or
+that the their this to was were what when where which who why with
+""".split())
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (llama3 averages about four characters per token)."""
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+def terms(text):
+    return {t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS}
+
+def source_label(source):
+    """Document name without the `_extracted.pdf` suffix added at ingestion."""
+    return (source or "").removesuffix("_extracted.pdf")
+
+def trim_to_tokens(text, max_tokens):
+    """Cut text at a word boundary so it fits `max_tokens`, marking the cut."""
+    limit = max_tokens * CHARS_PER_TOKEN - 3
+    if len(text) <= limit + 3:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > 0 else limit].rstrip() + "..."
+
+
+class ContextItem:
+    __slots__ = ("kind", "key", "entity", "line", "text", "entities", "order", "score")
+
+    def __init__(self, kind, key, entity, line, text, order):
+        self.kind = kind
+        self.key = key
+        self.entity = entity
+        self.line = line
+        self.text = text
+        self.entities = {entity}
+        self.order = order
+        self.score = 0.0
+
+
+def collect_items(retrievals):
+    """Flatten retrievals into unique facts and chunks, remembering every
+    entity each one was retrieved for."""
+    items = {}
+    for r in retrievals:
+        entity = r["entity"]
+        for n in r.get("neighbors") or []:
+            if not n["target"]:
+                continue
+            key = ("fact", n["source"], n["relation"], n["target"])
+            line = f"    • ({n['source']}) -[{n['relation']}]-> ({n['target']}) [📄 {source_label(n['provenance'])}]"
+            text = f"{n['source']} {n['relation']} {n['target']}"
+            _add_item(items, key, entity, line, text)
+        for c in r.get("chunks") or []:
+            key = ("chunk", c.get("chunk_id") or c["text"])
+            _add_item(items, key, entity, None, c["text"].strip())
+    return list(items.values())
+
+def _add_item(items, key, entity, line, text):
+    item = items.get(key)
+    if item is None:
+        items[key] = ContextItem(key[0], key, entity, line, text, len(items))
+    else:
+        item.entities.add(entity)
+
+
+def score_items(items, question):
+    """IDF-weighted overlap with the question, plus a small bonus for items
+    shared by several retrieved entities."""
+    question_terms = terms(question) if question else set()
+    item_terms = [terms(item.text) for item in items]
+
+    n = len(items)
+    doc_freq = {term: sum(1 for tokens in item_terms if term in tokens) for term in question_terms}
+    idf = {term: math.log(1 + n / df) for term, df in doc_freq.items() if df}
+    for item, tokens in zip(items, item_terms):
+        overlap = sum(idf[term] for term in question_terms & tokens)
+        if item.kind == "chunk" and tokens:
+            # Long chunks match more terms by chance
+            overlap /= math.sqrt(len(tokens) / 32) if len(tokens) > 32 else 1
+        item.score = overlap + 0.25 * (len(item.entities) - 1)
+
+
+def pack_context(retrievals, question=None, budget=None):
+    """
+    Select facts and chunks for the prompt within a token budget.
+    Returns: (context string, stats dict)
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    items = collect_items(retrievals)
+    score_items(items, question)
+
+    selected, used = [], 0
+    for item in sorted(items, key=lambda i: (-i.score, i.order)):
+        remaining = budget - used
+        if item.kind == "fact":
+            cost = estimate_tokens(item.line)
+            if cost > remaining:
+                continue
+        else:
+            cost = estimate_tokens(item.text) + 2
+            if cost > remaining:
+                if remaining < MIN_CHUNK_TOKENS:
+                    continue
+                item.text = trim_to_tokens(item.text, remaining - 2)
+                cost = estimate_tokens(item.text) + 2
+            item.line = f"    • {item.text}"
+        selected.append(item)
+        used += cost
+
+    # Group under the entity each item was first retrieved for, keeping
+    # the retrieval's entity order and relevance order within a group
+    lines, seen_entities = [], set()
+    for r in retrievals:
+        entity = r["entity"]
+        if entity in seen_entities:
+            continue
+        seen_entities.add(entity)
+        facts = [i.line for i in selected if i.entity == entity and i.kind == "fact"]
+        chunks = [i.line for i in selected if i.entity == entity and i.kind == "chunk"]
+        if not facts and not chunks:
+            continue
+        lines.append(f"\n🔍 Entity: {entity}")
+        if facts:
+            lines.append("  📊 Relations:")
+            lines.extend(facts)
+        if chunks:
+            lines.append("  📝 Supporting Text:")
+            lines.extend(chunks)
+
+    stats = {
+        "candidates": len(items),
+        "selected": len(selected),
+        "facts": sum(1 for i in selected if i.kind == "fact"),
+        "chunks": sum(1 for i in selected if i.kind == "chunk"),
+        "estimated_tokens": used,
+        "budget": budget
+    }
+    return "\n".join(lines) + "\n", stats
@@ -0,0 +1,75 @@
+import os
+import threading
+from cachetools import TTLCache
+
+
+def estimate_turn_bytes(turn):
+    """Approximate memory held by a stored turn, dominated by chunk texts."""
+    size = 256 + len(turn["question"])
+    for r in turn["retrievals"]:
+        size += 64 + len(r["entity"])
+        for n in r.get("neighbors") or []:
+            size += 128 + sum(len(v) for v in n.values() if isinstance(v, str))
+        for c in r.get("chunks") or []:
+            size += 128 + len(c.get("text") or "")
+    return size
+
+
+class ConversationStore:
+    """
+    Server-side state for conversations: the last turn's question and the
+    entities, facts and chunks retrieved for it, keyed by conversation_id.
+
+    Total size is bounded to roughly `max_bytes` (least recently used
+    conversations are evicted first) and idle conversations expire after
+    `ttl` seconds.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=1800):
+        self._store = TTLCache(maxsize=max_bytes, ttl=ttl, getsizeof=estimate_turn_bytes)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conversation_id):
+        if not conversation_id:
+            return None
+        with self._lock:
+            turn = self._store.get(conversation_id)
+            if turn is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return turn
+
+    def save(self, conversation_id, question, retrievals):
+        turn = {"question": question, "retrievals": retrievals}
+        with self._lock:
+            try:
+                self._store[conversation_id] = turn
+            except ValueError:
+                # Larger than the whole store; keep nothing rather than evict everything
+                self._store.pop(conversation_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._store.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "conversations": len(self._store),
+                "bytes": self._store.currsize,
+                "max_bytes": self._store.maxsize,
+                "ttl": self._store.ttl,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+def conversation_store_from_env():
+    return ConversationStore(
+        max_bytes=int(os.environ.get("GRAPH_RAG_CONVERSATION_BYTES", 64 * 1024 * 1024)),
+        ttl=int(os.environ.get("GRAPH_RAG_CONVERSATION_TTL", 1800))
+    )
@@ -1,10 +1,24 @@
-
+import os
+import bisect
+import argparse
+import tempfile
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-import json
+from artifacts import iter_records, write_records, legacy_path
+
+EXTRACTED_DIR = "./data/extracted_pdfs"
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+# Text buffered before splitting; bounds memory independently of document size
+STREAM_WINDOW = CHUNK_SIZE * 8
+# Bump whenever the splitting algorithm changes chunk boundaries
+CHUNKER_VERSION = "2"
 
 text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000,
-    chunk_overlap=100,
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
     length_function=len
 )
 
@@ -20,8 +34,89 @@ def create_chunks(corpus):
             })
             indexer += 1
     return chunks
-with open("./essentials/group_chunks.json", "r", encoding="utf-16") as f:
-    all_chunks = json.loads(f.read())
-    chunk_generator = create_chunks(all_chunks)
-    with open("./essentials/all_chunks.json", "w", encoding="utf-16") as out_f:
-        json.dump(chunk_generator, out_f, ensure_ascii=False, indent=4)
\ No newline at end of file
+
+
+# --- Streaming, page-aware chunking ---
+def stream_chunks(pages, window=STREAM_WINDOW):
+    """
+    Split a stream of page records into chunks without joining the whole
+    document. Pages are joined with a space (as in group_all_chunks.py) into
+    a buffer that is split once it holds `window` characters; every split
+    but the last is emitted, and the last one, which may still grow, is
+    carried over together with its overlap.
+    Yields: (text, page_start, page_end)
+    """
+    buffer, page_offsets, page_numbers = "", [], []
+    for i, page in enumerate(pages):
+        if i:
+            buffer += " "
+        page_offsets.append(len(buffer))
+        page_numbers.append(page["page"])
+        buffer += page["text"]
+        if len(buffer) >= window:
+            buffer, page_offsets, page_numbers = yield from _emit_splits(buffer, page_offsets, page_numbers)
+    yield from _emit_splits(buffer, page_offsets, page_numbers, final=True)
+
+def _emit_splits(buffer, page_offsets, page_numbers, final=False):
+    splits = text_splitter.split_text(buffer)
+    if not final and len(splits) < 2:
+        return buffer, page_offsets, page_numbers
+
+    def page_at(offset):
+        return page_numbers[bisect.bisect_right(page_offsets, offset) - 1]
+
+    cursor = 0
+    for split in splits if final else splits[:-1]:
+        start = buffer.find(split, cursor)
+        cursor = start + 1
+        yield split, page_at(start), page_at(start + len(split) - 1)
+    if final:
+        return "", [], []
+
+    # Keep the unfinished last split and the pages it spans
+    tail = buffer.find(splits[-1], cursor)
+    first = bisect.bisect_right(page_offsets, tail) - 1
+    return (buffer[tail:],
+            [max(offset - tail, 0) for offset in page_offsets[first:]],
+            page_numbers[first:])
+
+def document_source(pages_path):
+    """Source name of an extracted document, e.g. "manual_extracted.pdf"."""
+    return Path(legacy_path(pages_path)).stem + ".pdf"
+
+def chunk_document_file(pages_path, output_path):
+    """Stream one extracted document's pages into a chunk artifact."""
+    source = document_source(pages_path)
+    write_records(output_path, (
+        {"text": text, "source": source, "page_start": page_start, "page_end": page_end}
+        for text, page_start, page_end in stream_chunks(iter_records(pages_path))
+    ))
+    return output_path
+
+def chunk_documents(pages_paths, output_path, workers=None):
+    """Chunk documents in parallel and write them, in input order and with
+    sequential ids, to one chunk artifact. Returns the number of chunks."""
+    with tempfile.TemporaryDirectory() as tmp, ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(chunk_document_file, path, os.path.join(tmp, f"{i}.jsonl.gz"))
+                   for i, path in enumerate(pages_paths)]
+
+        def numbered():
+            indexer = 0
+            for path, future in zip(pages_paths, futures):
+                for chunk in iter_records(future.result()):
+                    yield {"id": f"chunk_{indexer}", **chunk}
+                    indexer += 1
+                print(f"  ✂️ {document_source(path)}")
+
+        return write_records(output_path, numbered(), key="id")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunk extracted PDFs into all_chunks")
+    parser.add_argument("--workers", type=int, default=None, help="documents chunked in parallel (default: CPU count)")
+    args = parser.parse_args()
+
+    names = sorted({legacy_path(f) for f in os.listdir(EXTRACTED_DIR) if f.endswith((".json", ".jsonl.gz"))})
+    count = chunk_documents([os.path.join(EXTRACTED_DIR, f) for f in names], "./essentials/all_chunks.json",
+                            workers=args.workers)
+    print(f"✅ {count} chunks from {len(names)} documents saved to ./essentials/all_chunks.json")
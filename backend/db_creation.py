@@ -1,4 +1,10 @@
 import json
+import time
+import uuid
+import argparse
+from datetime import datetime
+from artifacts import load_records
+from canonicalize_entities import load_aliases, apply_aliases, alias_rows, merge_rows
 from neo4j import GraphDatabase
 import warnings
 warnings.filterwarnings("ignore")
@@ -36,27 +42,193 @@ def insert_triplet(tx, triplet_id, subject, relation, obj, source, chunk_id):
     tx.run(query, chunk_id=chunk_id, subject=subject, relation=relation,
            object=obj, triplet_id=triplet_id, source=source)
 
+def stamp_graph_version(tx):
+    """Write a fresh graph version so API retrieval caches invalidate themselves."""
+    query = """
+    MERGE (m:GraphMeta {key: 'graph'})
+    SET m.version = $version,
+        m.updated_at = $updated_at
+    """
+    tx.run(query, version=uuid.uuid4().hex, updated_at=datetime.now().isoformat())
+
+def chunk_id_from_triplet_id(triplet_id):
+    return "_".join(triplet_id.split("_")[:2])
+
+
+# --- Bulk ingestion ---
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT file_id_unique IF NOT EXISTS FOR (f:File) REQUIRE f.file_id IS UNIQUE",
+    "CREATE CONSTRAINT chunk_id_unique IF NOT EXISTS FOR (c:Chunk) REQUIRE c.chunk_id IS UNIQUE",
+    "CREATE CONSTRAINT entity_name_unique IF NOT EXISTS FOR (e:Entity) REQUIRE e.name IS UNIQUE",
+    "CREATE INDEX file_name IF NOT EXISTS FOR (f:File) ON (f.name)",
+    "CREATE INDEX chunk_source IF NOT EXISTS FOR (c:Chunk) ON (c.source)",
+    "CREATE INDEX relation_triplet_id IF NOT EXISTS FOR ()-[r:RELATION]-() ON (r.triplet_id)",
+    "CREATE INDEX relation_source IF NOT EXISTS FOR ()-[r:RELATION]-() ON (r.source)",
+    # Aliases merged away by canonicalize_entities.py stay searchable
+    "CREATE FULLTEXT INDEX entityIndex IF NOT EXISTS FOR (e:Entity) ON EACH [e.name, e.aliases]",
+]
+
+# entityIndex used to cover e.name only; IF NOT EXISTS would keep that definition
+OUTDATED_ENTITY_INDEX_QUERY = """
+SHOW FULLTEXT INDEXES YIELD name, properties
+WHERE name = 'entityIndex' AND NOT 'aliases' IN properties
+RETURN name
+"""
+
+BULK_FILES_QUERY = """
+UNWIND $rows AS row
+MERGE (f:File {file_id: row.file_id})
+SET f.name = row.name,
+    f.url = row.url,
+    f.description = row.description
+"""
+
+BULK_CHUNKS_QUERY = """
+UNWIND $rows AS row
+MATCH (f:File {name: row.source})
+MERGE (c:Chunk {chunk_id: row.chunk_id})
+SET c.text = row.text,
+    c.source = row.source,
+    c.page_start = row.page_start,
+    c.page_end = row.page_end
+MERGE (f)-[:HAS_CHUNK]->(c)
+"""
+
+BULK_TRIPLETS_QUERY = """
+UNWIND $rows AS row
+MATCH (c:Chunk {chunk_id: row.chunk_id})
+MERGE (s:Entity {name: row.subject})
+MERGE (o:Entity {name: row.object})
+MERGE (s)-[r:RELATION {type: row.relation, triplet_id: row.triplet_id, source: row.source}]->(o)
+MERGE (c)-[:CONTAINS_ENTITY]->(s)
+MERGE (c)-[:CONTAINS_ENTITY]->(o)
+"""
+
+BULK_ALIASES_QUERY = """
+UNWIND $rows AS row
+MATCH (e:Entity {name: row.name})
+SET e.aliases = row.aliases
+"""
+
+# Entity nodes loaded under a name that is now an alias (an older graph, or
+# documents the incremental pipeline has not reloaded) are folded into the
+# canonical node: their relations and chunk links move over, dropping the
+# self-loops a merge creates, and the alias node is deleted
+MERGE_ALIAS_NODES_QUERY = """
+UNWIND $rows AS row
+MATCH (alias:Entity {name: row.alias})
+MERGE (canonical:Entity {name: row.canonical})
+WITH alias, canonical
+CALL {
+    WITH alias, canonical
+    MATCH (alias)-[r:RELATION]->(o)
+    WHERE o <> canonical AND o <> alias
+    MERGE (canonical)-[:RELATION {type: r.type, triplet_id: r.triplet_id, source: r.source}]->(o)
+}
+CALL {
+    WITH alias, canonical
+    MATCH (s)-[r:RELATION]->(alias)
+    WHERE s <> canonical AND s <> alias
+    MERGE (s)-[:RELATION {type: r.type, triplet_id: r.triplet_id, source: r.source}]->(canonical)
+}
+CALL {
+    WITH alias, canonical
+    MATCH (c:Chunk)-[:CONTAINS_ENTITY]->(alias)
+    MERGE (c)-[:CONTAINS_ENTITY]->(canonical)
+}
+DETACH DELETE alias
+"""
+
+def create_schema(session):
+    """Create the constraints and indexes the loader and retrieval queries rely on."""
+    if session.run(OUTDATED_ENTITY_INDEX_QUERY).single() is not None:
+        session.run("DROP INDEX entityIndex").consume()
+    for statement in SCHEMA_STATEMENTS:
+        session.run(statement).consume()
+    session.run("CALL db.awaitIndexes()").consume()
+
+def _write_batch(tx, query, rows):
+    tx.run(query, rows=rows).consume()
+
+def bulk_write(session, query, rows, batch_size=1000, label="rows"):
+    """Write `rows` with an UNWIND query in batches of `batch_size`, reporting throughput."""
+    start_time = time.time()
+    total = len(rows)
+    for offset in range(0, total, batch_size):
+        batch = rows[offset:offset + batch_size]
+        session.write_transaction(_write_batch, query, batch)
+
+        done = offset + len(batch)
+        elapsed = time.time() - start_time
+        rate = done / elapsed if elapsed > 0 else float("inf")
+        print(f"  📦 {label}: {done}/{total} ({rate:,.0f} rows/sec)")
+
+    elapsed = time.time() - start_time
+    return total / elapsed if elapsed > 0 else float("inf")
+
+def file_rows(files):
+    return [{"file_id": f"file_{i}", "name": f["name"], "url": f["url"], "description": f["description"]}
+            for i, f in enumerate(files)]
+
+def chunk_rows(chunks):
+    return [{"chunk_id": c["id"], "text": c["text"], "source": c["source"],
+             "page_start": c.get("page_start"), "page_end": c.get("page_end")} for c in chunks]
+
+def triplet_rows(triplets):
+    return [{"triplet_id": t["triplet_id"], "subject": t["subject"], "relation": t["relation"],
+             "object": t["object"], "source": t["source"],
+             "chunk_id": chunk_id_from_triplet_id(t["triplet_id"])}
+            for t in triplets]
+
+def bulk_load(session, files, chunks, triplets, batch_size=1000, aliases=None):
+    """Load everything with UNWIND batches; `triplets` should already be canonicalized."""
+    create_schema(session)
+    bulk_write(session, BULK_FILES_QUERY, file_rows(files), batch_size, "files")
+    bulk_write(session, BULK_CHUNKS_QUERY, chunk_rows(chunks), batch_size, "chunks")
+    bulk_write(session, BULK_TRIPLETS_QUERY, triplet_rows(triplets), batch_size, "triplets")
+    if aliases:
+        merge_alias_entities(session, aliases, batch_size)
+
+def merge_alias_entities(session, aliases, batch_size=1000):
+    """Fold existing alias Entity nodes into their canonical nodes and record the aliases on them."""
+    bulk_write(session, MERGE_ALIAS_NODES_QUERY, merge_rows(aliases), batch_size, "alias merges")
+    bulk_write(session, BULK_ALIASES_QUERY, alias_rows(aliases), batch_size, "aliases")
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load files, chunks and triplets into Neo4j")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per UNWIND batch in bulk mode")
+    parser.add_argument("--row-by-row", action="store_true", help="use one transaction per row (legacy loader)")
+    args = parser.parse_args()
+
     with open("./essentials/file_metadata.json", "r", encoding="utf-8") as f:
         files = json.load(f)
 
-    with open("./essentials/all_chunks.json", "r", encoding="utf-16") as f:
-        chunks = json.load(f)
-
-    with open("./essentials/knowledge_triplets.json", "r", encoding="utf-16") as f:
-        triplets = json.load(f)
+    chunks = load_records("./essentials/all_chunks.json")
+    # Collapse near-duplicate entities (see canonicalize_entities.py)
+    aliases = load_aliases()
+    triplets = apply_aliases(load_records("./essentials/knowledge_triplets.json"), aliases)
 
     with driver.session() as session:
-    
-        for i, f in enumerate(files):
-            session.write_transaction(insert_file, f"file_{i}", f["name"], f["url"], f["description"])
-
-        for c in chunks:
-            session.write_transaction(insert_chunk, c["id"], c["text"], c["source"])
-    
-        for t in triplets:
-            chunk_id = "_".join(t["triplet_id"].split("_")[:2])
-            session.write_transaction(insert_triplet, t["triplet_id"], t["subject"], t["relation"], t["object"], t["source"], chunk_id)
+        if not args.row_by_row:
+            bulk_load(session, files, chunks, triplets, batch_size=args.batch_size, aliases=aliases)
+        else:
+            for i, f in enumerate(files):
+                session.write_transaction(insert_file, f"file_{i}", f["name"], f["url"], f["description"])
+
+            for c in chunks:
+                session.write_transaction(insert_chunk, c["id"], c["text"], c["source"])
+        
+            for t in triplets:
+                chunk_id = chunk_id_from_triplet_id(t["triplet_id"])
+                session.write_transaction(insert_triplet, t["triplet_id"], t["subject"], t["relation"], t["object"], t["source"], chunk_id)
+            if aliases:
+                merge_alias_entities(session, aliases, args.batch_size)
+
+        # Precomputed per-entity context blocks used at query time
+        from entity_summaries import update_summaries
+        update_summaries(session, chunks, triplets, batch_size=args.batch_size, force=True)
+
+        session.write_transaction(stamp_graph_version)
 
     print("✅ Files, chunks, and triplets inserted into Neo4j")
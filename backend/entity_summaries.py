@@ -0,0 +1,151 @@
+"""
+Per-entity context blocks materialized at ingest time.
+
+For every entity this stores what retrieval would otherwise assemble on
+each request: its relations, deduplicated and ranked by how many triplets
+support them, and excerpts of the chunks that mention it most, cut around
+the first mention. Blocks have the same shape as a retrieval result
+({"entity", "neighbors", "chunks"}), so query time is a key lookup
+(Entity.summary in Neo4j) instead of expansion and chunk traversals.
+
+Each block carries a hash of the entity's neighborhood (triplet ids,
+relations, neighbors, chunk ids), and a refresh only rebuilds and writes
+the blocks whose hash changed.
+
+Rebuild from the artifacts and push the changes to Neo4j with:
+    python entity_summaries.py
+"""
+import json
+import hashlib
+import argparse
+from collections import defaultdict
+from artifacts import iter_records, load_records, write_records
+from canonicalize_entities import load_aliases, apply_aliases
+from context_packer import trim_to_tokens
+from db_creation import driver, bulk_write, chunk_id_from_triplet_id
+
+SUMMARIES_PATH = "./essentials/entity_summaries.json"
+CHUNKS_PATH = "./essentials/all_chunks.json"
+TRIPLETS_PATH = "./essentials/knowledge_triplets.json"
+
+# Bump whenever the block layout or ranking changes so every block is rebuilt
+SUMMARY_VERSION = "1"
+NEIGHBOR_LIMIT = 20
+CHUNK_LIMIT = 5
+EXCERPT_TOKENS = 120
+
+BULK_SUMMARIES_QUERY = """
+UNWIND $rows AS row
+MATCH (e:Entity {name: row.entity})
+SET e.summary = row.summary,
+    e.summary_hash = row.hash
+"""
+
+
+# --- Building blocks ---
+def neighborhoods(triplets):
+    """Triplets touching each entity, in artifact order."""
+    by_entity = defaultdict(list)
+    for t in triplets:
+        by_entity[t["subject"]].append(t)
+        if t["object"] != t["subject"]:
+            by_entity[t["object"]].append(t)
+    return by_entity
+
+def neighborhood_hash(entity, entity_triplets):
+    digest = hashlib.sha1(f"{SUMMARY_VERSION}\x00{entity}".encode("utf-8"))
+    for line in sorted(f"{t['triplet_id']}\x00{t['subject']}\x00{t['relation']}\x00{t['object']}\x00{t['source']}"
+                       for t in entity_triplets):
+        digest.update(line.encode("utf-8"))
+    return digest.hexdigest()
+
+def excerpt(text, entity, max_tokens=EXCERPT_TOKENS):
+    """Chunk text from the sentence of the entity's first mention, trimmed to `max_tokens`."""
+    text = " ".join(text.split())
+    at = text.lower().find(entity.lower())
+    if at > 0:
+        start = text.rfind(". ", 0, at)
+        text = ("..." if start > 0 else "") + text[start + 2 if start > 0 else 0:]
+    return trim_to_tokens(text, max_tokens)
+
+def build_summary(entity, entity_triplets, chunks_by_id):
+    """Ranked, deduplicated relations and chunk excerpts for one entity."""
+    relations = {}
+    chunk_support = defaultdict(int)
+    for t in entity_triplets:
+        # Keep the triplet's direction, since relations are directed phrases
+        key = (t["subject"].lower(), t["relation"].lower(), t["object"].lower())
+        if key not in relations:
+            relations[key] = [0, {"source": t["subject"], "relation": t["relation"], "target": t["object"],
+                                  "provenance": t["source"]}]
+        relations[key][0] += 1
+        chunk_support[chunk_id_from_triplet_id(t["triplet_id"])] += 1
+
+    # Stable sorts keep first-seen order among equally supported items
+    neighbors = [n for _, n in sorted(relations.values(), key=lambda r: -r[0])][:NEIGHBOR_LIMIT]
+    chunks = []
+    for chunk_id in sorted(chunk_support, key=lambda c: -chunk_support[c]):
+        chunk = chunks_by_id.get(chunk_id)
+        if chunk is None:
+            continue
+        chunks.append({"chunk_id": chunk_id, "text": excerpt(chunk["text"], entity), "source": chunk["source"]})
+        if len(chunks) >= CHUNK_LIMIT:
+            break
+    return {"entity": entity, "neighbors": neighbors, "chunks": chunks}
+
+
+def refresh_summaries(chunks, triplets, previous=None):
+    """
+    Blocks for every entity in `triplets` (already canonicalized), reusing
+    blocks from `previous` whose neighborhood hash is unchanged.
+    Returns: (all blocks, blocks that were rebuilt)
+    """
+    previous = {s["entity"]: s for s in previous or []}
+    chunks_by_id = {c["id"]: c for c in chunks}
+
+    summaries, changed = [], []
+    for entity, entity_triplets in neighborhoods(triplets).items():
+        digest = neighborhood_hash(entity, entity_triplets)
+        summary = previous.get(entity)
+        if summary is None or summary["hash"] != digest:
+            summary = {**build_summary(entity, entity_triplets, chunks_by_id), "hash": digest}
+            changed.append(summary)
+        summaries.append(summary)
+    return summaries, changed
+
+
+# --- Storage ---
+def summary_rows(summaries):
+    """Rows for BULK_SUMMARIES_QUERY; Neo4j properties cannot hold maps, so blocks are JSON strings."""
+    return [{"entity": s["entity"], "hash": s["hash"],
+             "summary": json.dumps({"neighbors": s["neighbors"], "chunks": s["chunks"]}, ensure_ascii=False)}
+            for s in summaries]
+
+def update_summaries(session, chunks, triplets, batch_size=1000, force=False, path=SUMMARIES_PATH):
+    """
+    Write the blocks that changed (all of them with `force`, e.g. after a
+    full load) to Neo4j, then refresh the summaries artifact.
+    `triplets` are raw artifact triplets; entity aliases are applied here.
+    """
+    previous = None if force else load_records(path, default=[])
+    summaries, changed = refresh_summaries(chunks, apply_aliases(triplets, load_aliases()), previous)
+    if changed:
+        bulk_write(session, BULK_SUMMARIES_QUERY, summary_rows(changed), batch_size, "summaries")
+    # Only record the new hashes once Neo4j has the blocks; after a failed
+    # write the next refresh still sees them as changed
+    write_records(path, summaries, key="entity")
+    print(f"🧾 Entity summaries: {len(changed)} rebuilt, {len(summaries) - len(changed)} unchanged")
+    return changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Materialize per-entity context blocks and store them in Neo4j")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per UNWIND batch")
+    parser.add_argument("--force", action="store_true", help="rebuild and rewrite every block")
+    args = parser.parse_args()
+
+    chunks = list(iter_records(CHUNKS_PATH))
+    triplets = load_records(TRIPLETS_PATH)
+    with driver.session() as session:
+        update_summaries(session, chunks, triplets, batch_size=args.batch_size, force=args.force)
+    print("✅ Entity summaries up to date")
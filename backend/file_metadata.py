@@ -4,6 +4,14 @@ from datetime import datetime
 import PyPDF2
 import json
 
+def file_sha256(file_path):
+    """SHA256 of a file's contents, read in 4 KB blocks."""
+    sha256_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for byte_block in iter(lambda: f.read(4096), b""):
+            sha256_hash.update(byte_block)
+    return sha256_hash.hexdigest()
+
 def get_file_metadata(file_path, description=""):
     """Extract metadata from a PDF file and return JSON-like dict"""
 
@@ -20,11 +28,7 @@ def get_file_metadata(file_path, description=""):
     metadata["json_file"] = file_name.replace(".pdf", ".json")
 
     # SHA256 hash
-    sha256_hash = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
-    metadata["hash"] = sha256_hash.hexdigest()
+    metadata["hash"] = file_sha256(file_path)
 
     # Page count
     try:
@@ -0,0 +1,361 @@
+"""
+In-memory retrieval backend.
+
+Holds the Entity/Chunk/RELATION graph as compressed sparse row (CSR) arrays
+over interned integer IDs, so expand_entity and get_chunks_for_entity are
+array slices instead of Neo4j round trips. The graph can be loaded from a
+running Neo4j or straight from essentials/*.json, which also allows serving
+without a live database (GRAPH_RAG_BACKEND=memory, see retrieval_mechs.py).
+
+Unlike the Cypher query, which reports type(r) ("RELATION"), neighbor
+`relation` values here are the triplet's own relation text (r.type).
+"""
+import os
+import re
+import math
+import threading
+import numpy as np
+from artifacts import iter_records, load_records, resolve, compact_path, ArtifactIndex, INDEX_SUFFIX
+from canonicalize_entities import ALIASES_PATH, load_aliases, apply_aliases
+
+CHUNKS_PATH = "./essentials/all_chunks.json"
+TRIPLETS_PATH = "./essentials/knowledge_triplets.json"
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+def build_csr(rows, cols, n_rows, *payloads):
+    """Group (row, col, payload...) edges by row. Returns indptr, cols, payloads."""
+    rows = np.asarray(rows, dtype=np.int64)
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    sorted_payloads = [np.asarray(p, dtype=np.int32)[order] for p in payloads]
+    return (indptr, np.asarray(cols, dtype=np.int32)[order], *sorted_payloads)
+
+
+class Interner:
+    """Map strings to dense integer codes and back."""
+
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def intern(self, value):
+        code = self.ids.get(value)
+        if code is None:
+            code = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class CSRGraph:
+    """
+    Read-only, array-backed copy of the knowledge graph.
+
+    - entity adjacency: undirected RELATION edges in CSR form, with relation
+      type and provenance stored as interned codes per edge
+    - entity -> chunk incidence (CONTAINS_ENTITY) in CSR form
+    - a token inverted index over entity names standing in for the
+      `entityIndex` fulltext index
+    """
+
+    def __init__(self, triplets, chunks, chunk_entities, version=None):
+        """
+        triplets: iterable of (subject, relation, object, provenance)
+        chunks: iterable of (chunk_id, text, source)
+        chunk_entities: iterable of (chunk_id, entity_name)
+        """
+        self.version = version
+        self.entities = Interner()
+        self.relations = Interner()
+        self.provenances = Interner()
+
+        # Chunk columns
+        self.chunk_ids, self.chunk_texts, self.chunk_sources = [], [], []
+        self.chunk_index = chunk_index = {}
+        for chunk_id, text, source in chunks:
+            if chunk_id not in chunk_index:
+                chunk_index[chunk_id] = len(self.chunk_ids)
+                self.chunk_ids.append(chunk_id)
+                self.chunk_texts.append(text)
+                self.chunk_sources.append(source)
+
+        # RELATION edges, stored in both directions like an undirected MATCH
+        src, dst, rel, prov = [], [], [], []
+        for subject, relation, obj, provenance in triplets:
+            s, o = self.entities.intern(subject), self.entities.intern(obj)
+            r, p = self.relations.intern(relation), self.provenances.intern(provenance)
+            src += [s, o]
+            dst += [o, s]
+            rel += [r, r]
+            prov += [p, p]
+
+        # CONTAINS_ENTITY incidence, deduplicated
+        pairs = set()
+        for chunk_id, entity in chunk_entities:
+            if chunk_id in chunk_index:
+                pairs.add((self.entities.intern(entity), chunk_index[chunk_id]))
+        pairs = sorted(pairs, key=lambda pair: pair[1])
+
+        n = len(self.entities)
+        self.indptr, self.indices, self.edge_relations, self.edge_provenances = build_csr(src, dst, n, rel, prov)
+        self.chunk_indptr, self.chunk_indices = build_csr([e for e, _ in pairs], [c for _, c in pairs], n)
+
+        # One row per triplet (every other half-edge), for ranking facts
+        self.triplet_subjects = np.asarray(src[0::2], dtype=np.int32)
+        self.triplet_objects = np.asarray(dst[0::2], dtype=np.int32)
+        self.triplet_relations = np.asarray(rel[0::2], dtype=np.int32)
+        self.triplet_provenances = np.asarray(prov[0::2], dtype=np.int32)
+
+        # Random-walk normalization and the row of every CSR slot
+        self.degrees = np.diff(self.indptr)
+        self.inv_degrees = np.divide(1.0, self.degrees, out=np.zeros(n), where=self.degrees > 0)
+        self.nonempty_rows = np.flatnonzero(self.degrees)
+        self.chunk_rows = np.repeat(np.arange(n), np.diff(self.chunk_indptr))
+
+        self._build_name_index()
+
+    def _build_name_index(self):
+        postings = {}
+        self.name_lengths = np.zeros(len(self.entities), dtype=np.int32)
+        for code, name in enumerate(self.entities.values):
+            tokens = set(tokenize(name))
+            self.name_lengths[code] = max(len(tokens), 1)
+            for token in tokens:
+                postings.setdefault(token, []).append(code)
+
+        n = max(len(self.entities), 1)
+        self.postings = {token: np.asarray(codes, dtype=np.int32) for token, codes in postings.items()}
+        self.idf = {token: math.log(1 + n / len(codes)) for token, codes in postings.items()}
+
+    # --- Loaders ---
+    @classmethod
+    def from_artifacts(cls, chunks_path=CHUNKS_PATH, triplets_path=TRIPLETS_PATH):
+        """Load from the pipeline's all_chunks and knowledge_triplets artifacts,
+        with entity aliases collapsed as in db_creation.py."""
+        chunks = iter_records(chunks_path)
+        triplets = apply_aliases(load_records(triplets_path), load_aliases())
+
+        chunk_entities = []
+        for t in triplets:
+            chunk_id = "_".join(t["triplet_id"].split("_")[:2])
+            chunk_entities += [(chunk_id, t["subject"]), (chunk_id, t["object"])]
+
+        version = f"artifacts:{os.path.getmtime(resolve(chunks_path))}:{os.path.getmtime(resolve(triplets_path))}"
+        if os.path.exists(ALIASES_PATH):
+            version += f":{os.path.getmtime(ALIASES_PATH)}"
+        return cls(
+            ((t["subject"], t["relation"], t["object"], t["source"]) for t in triplets),
+            ((c["id"], c["text"], c["source"]) for c in chunks),
+            chunk_entities,
+            version=version
+        )
+
+    @classmethod
+    def from_neo4j(cls, driver):
+        """Load a snapshot of the graph from Neo4j."""
+        with driver.session() as session:
+            triplets = [tuple(r.values()) for r in session.run(
+                "MATCH (s:Entity)-[r:RELATION]->(o:Entity) RETURN s.name, r.type, o.name, r.source"
+            )]
+            chunks = [tuple(r.values()) for r in session.run(
+                "MATCH (c:Chunk) RETURN c.chunk_id, c.text, c.source"
+            )]
+            chunk_entities = [tuple(r.values()) for r in session.run(
+                "MATCH (c:Chunk)-[:CONTAINS_ENTITY]->(e:Entity) RETURN c.chunk_id, e.name"
+            )]
+            record = session.run("OPTIONAL MATCH (m:GraphMeta {key: 'graph'}) RETURN m.version AS version").single()
+        return cls(triplets, chunks, chunk_entities, version=record["version"])
+
+    # --- Retrieval interface (mirrors retrieval_mechs) ---
+    def search_entities(self, question, limit=10):
+        """Rank entities by idf-weighted name token overlap with the question."""
+        scores = np.zeros(len(self.entities), dtype=np.float64)
+        for token in set(tokenize(question)):
+            codes = self.postings.get(token)
+            if codes is not None:
+                scores[codes] += self.idf[token]
+
+        hits = np.flatnonzero(scores)
+        if hits.size == 0:
+            return []
+        scores = scores[hits] / np.sqrt(self.name_lengths[hits])
+        order = np.argsort(-scores, kind="stable")[:limit]
+        return [{"entity": self.entities.values[hits[i]], "score": float(scores[i])} for i in order]
+
+    def expand_entity(self, entity, limit=20):
+        code = self.entities.ids.get(entity)
+        if code is None:
+            return []
+        start = self.indptr[code]
+        end = min(self.indptr[code + 1], start + limit)
+        names, relations, provenances = self.entities.values, self.relations.values, self.provenances.values
+        return [
+            {"source": entity, "relation": relations[r], "target": names[t], "provenance": provenances[p]}
+            for t, r, p in zip(self.indices[start:end].tolist(),
+                               self.edge_relations[start:end].tolist(),
+                               self.edge_provenances[start:end].tolist())
+        ]
+
+    def get_chunks_for_entity(self, entity, limit=5):
+        code = self.entities.ids.get(entity)
+        if code is None:
+            return []
+        start = self.chunk_indptr[code]
+        end = min(self.chunk_indptr[code + 1], start + limit)
+        return [
+            {"chunk_id": self.chunk_ids[c], "text": self.chunk_texts[c], "source": self.chunk_sources[c]}
+            for c in self.chunk_indices[start:end].tolist()
+        ]
+
+    def get_chunk(self, chunk_id):
+        c = self.chunk_index.get(chunk_id)
+        if c is None:
+            return None
+        return {"chunk_id": chunk_id, "text": self.chunk_texts[c], "source": self.chunk_sources[c]}
+
+    def retrieve_context(self, question, topk_entities=3):
+        return [
+            {
+                "entity": ent["entity"],
+                "neighbors": self.expand_entity(ent["entity"]),
+                "chunks": self.get_chunks_for_entity(ent["entity"])
+            }
+            for ent in self.search_entities(question, limit=topk_entities)
+        ]
+
+    # --- Multi-hop retrieval ---
+    def propagate(self, X):
+        """One random-walk step for a batch of distributions: returns P^T X,
+        where P moves uniformly from an entity to its neighbors."""
+        contributions = (X * self.inv_degrees[:, None])[self.indices]
+        Y = np.zeros_like(X)
+        if self.nonempty_rows.size:
+            Y[self.nonempty_rows] = np.add.reduceat(contributions, self.indptr[self.nonempty_rows], axis=0)
+        return Y
+
+    def personalized_pagerank(self, seed_codes, hops=3, restart=0.15):
+        """
+        Random walk with restart from each seed, truncated at `hops` steps so
+        mass never travels further than `hops` edges. All seeds are advanced
+        together as the columns of one (n_entities x n_seeds) matrix.
+        """
+        n, k = len(self.entities), len(seed_codes)
+        restart_matrix = np.zeros((n, k))
+        restart_matrix[seed_codes, np.arange(k)] = 1.0
+
+        X = restart_matrix
+        for _ in range(hops):
+            X = restart * restart_matrix + (1 - restart) * self.propagate(X)
+        return X
+
+    def retrieve_context_multihop(self, question, topk_entities=3, seeds=None, hops=3,
+                                  max_facts=30, max_chunks=8, restart=0.15):
+        """
+        Rank triplets and chunks up to `hops` edges from the search hits by
+        personalized PageRank and return the best `max_facts` / `max_chunks`
+        in the usual [{entity, neighbors, chunks}] shape. Each fact or chunk
+        is listed under the seed entity whose walk contributes most to it.
+
+        `seeds` may be passed in (e.g. Neo4j fulltext hits); otherwise they
+        come from this graph's own `search_entities`.
+        """
+        if seeds is None:
+            seeds = self.search_entities(question, limit=topk_entities)
+        seeds = [s for s in seeds if s["entity"] in self.entities.ids]
+        if not seeds:
+            return []
+
+        seed_codes = np.asarray([self.entities.ids[s["entity"]] for s in seeds])
+        weights = np.asarray([s.get("score", 1.0) for s in seeds], dtype=np.float64)
+        weights = weights / weights.sum() if weights.sum() > 0 else np.full(len(seeds), 1.0 / len(seeds))
+
+        # Per-seed relevance of every entity
+        relevance = self.personalized_pagerank(seed_codes, hops=hops, restart=restart) * weights
+
+        # Facts: both endpoints should be relevant
+        fact_scores = np.sqrt(relevance[self.triplet_subjects] * relevance[self.triplet_objects])
+        fact_totals = fact_scores.sum(axis=1)
+        top_facts = np.argsort(-fact_totals, kind="stable")[:max_facts]
+        top_facts = top_facts[fact_totals[top_facts] > 0]
+
+        # Chunks: accumulate the relevance of the entities they contain
+        n_chunks = len(self.chunk_ids)
+        chunk_scores = np.stack([
+            np.bincount(self.chunk_indices, weights=relevance[self.chunk_rows, j], minlength=n_chunks)
+            for j in range(len(seeds))
+        ], axis=1) if n_chunks else np.zeros((0, len(seeds)))
+        chunk_totals = chunk_scores.sum(axis=1)
+        top_chunks = np.argsort(-chunk_totals, kind="stable")[:max_chunks]
+        top_chunks = top_chunks[chunk_totals[top_chunks] > 0]
+
+        names, relations, provenances = self.entities.values, self.relations.values, self.provenances.values
+        context = [{"entity": s["entity"], "neighbors": [], "chunks": []} for s in seeds]
+        for t in top_facts.tolist():
+            context[int(fact_scores[t].argmax())]["neighbors"].append({
+                "source": names[self.triplet_subjects[t]],
+                "relation": relations[self.triplet_relations[t]],
+                "target": names[self.triplet_objects[t]],
+                "provenance": provenances[self.triplet_provenances[t]],
+                "score": float(fact_totals[t])
+            })
+        for c in top_chunks.tolist():
+            context[int(chunk_scores[c].argmax())]["chunks"].append({
+                "chunk_id": self.chunk_ids[c],
+                "text": self.chunk_texts[c],
+                "source": self.chunk_sources[c],
+                "score": float(chunk_totals[c])
+            })
+        return context
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+def get_graph(loader=None):
+    """Return the process-wide graph, loading it on first use with `loader`
+    (from the JSON artifacts by default). Concurrent first calls load it once."""
+    global _graph
+    graph = _graph
+    if graph is None:
+        with _graph_lock:
+            if _graph is None:
+                _graph = loader() if loader else CSRGraph.from_artifacts()
+            graph = _graph
+    return graph
+
+def loaded_graph():
+    """The process-wide graph if it has been loaded, else None."""
+    return _graph
+
+def set_graph(graph):
+    global _graph
+    with _graph_lock:
+        _graph = graph
+
+
+_chunk_index = (None, None)
+
+def get_artifact_chunk(chunk_id, path=CHUNKS_PATH):
+    """
+    One chunk read straight from the chunks artifact through its sidecar
+    index, without loading the graph; the index is reopened when the
+    artifact is rewritten. Raises FileNotFoundError without an index.
+    """
+    global _chunk_index
+    mtime = os.path.getmtime(compact_path(path) + INDEX_SUFFIX)
+    loaded_mtime, index = _chunk_index
+    if loaded_mtime != mtime:
+        index = ArtifactIndex(path)
+        _chunk_index = (mtime, index)
+    chunk = index.get(chunk_id)
+    if chunk is None:
+        return None
+    return {"chunk_id": chunk_id, "text": chunk["text"], "source": chunk["source"]}
@@ -1,13 +1,17 @@
 import os
-import json
+from artifacts import iter_records, write_records, legacy_path
 
 
-all_chunks = []
-for i in os.listdir("./data/extracted_pdfs"):
-    with open(os.path.join("./data/extracted_pdfs", i), "r", encoding="utf-16") as f:
-        corpus = json.load(f)
-        all_text = ' '.join([j['text'] for j in corpus])
-        all_chunks.append({"text": all_text, "source": i})
+def group_pages(pages):
+    """Join the page records of one extracted document into a single text."""
+    return ' '.join([j['text'] for j in pages])
 
-with open("./essentials/group_chunks.json", "w", encoding="utf-16") as f:
-    json.dump(all_chunks, f, ensure_ascii=False, indent=4)
\ No newline at end of file
+
+if __name__ == "__main__":
+    # One entry per document, whether it is stored compact or legacy
+    names = sorted({legacy_path(i) for i in os.listdir("./data/extracted_pdfs") if i.endswith((".json", ".jsonl.gz"))})
+    all_chunks = (
+        {"text": group_pages(iter_records(os.path.join("./data/extracted_pdfs", i))), "source": i}
+        for i in names
+    )
+    write_records("./essentials/group_chunks.json", all_chunks)
@@ -0,0 +1,139 @@
+"""
+Per-stage timing for the RAG pipeline.
+
+Every stage (fulltext search, each expand_entity / get_chunks_for_entity,
+format_context, the LLM call, ...) is recorded into Prometheus histograms
+served on /metrics. Spans are also appended to a per-request list held in a
+context variable, so an endpoint can return its own timing breakdown.
+"""
+import time
+import inspect
+import functools
+import contextvars
+from contextlib import contextmanager
+from prometheus_client import Histogram, Counter, Gauge, CONTENT_TYPE_LATEST, generate_latest
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "graphrag_stage_seconds", "Time spent per pipeline stage", ["stage"], buckets=LATENCY_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "graphrag_request_seconds", "End-to-end request time per endpoint", ["endpoint"], buckets=LATENCY_BUCKETS
+)
+LLM_TTFT_SECONDS = Histogram(
+    "graphrag_llm_time_to_first_token_seconds", "Time from sending the prompt to the first token",
+    buckets=LATENCY_BUCKETS
+)
+LLM_PROMPT_CHARS = Histogram(
+    "graphrag_llm_prompt_chars", "Prompt size in characters",
+    buckets=(500, 1000, 2000, 4000, 6000, 8000, 12000, 16000, 24000, 32000)
+)
+LLM_PROMPT_TOKENS = Histogram(
+    "graphrag_llm_prompt_tokens", "Prompt size in tokens as reported by Ollama",
+    buckets=(128, 256, 512, 1024, 1536, 2048, 3072, 4096, 6144, 8192)
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "graphrag_llm_tokens_per_second", "Generation speed as reported by Ollama",
+    buckets=(1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200)
+)
+STAGE_ERRORS = Counter("graphrag_stage_errors_total", "Stages that raised", ["stage"])
+
+# --- LLM admission control ---
+ADMISSION_QUEUE_SECONDS = Histogram(
+    "graphrag_llm_queue_seconds", "Time spent waiting for an LLM slot", ["priority"], buckets=LATENCY_BUCKETS
+)
+ADMISSION_REJECTED = Counter("graphrag_llm_rejected_total", "Requests turned away by admission control", ["reason"])
+LLM_IN_FLIGHT = Gauge("graphrag_llm_in_flight", "LLM calls currently running")
+LLM_QUEUE_DEPTH = Gauge("graphrag_llm_queue_depth", "Requests waiting for an LLM slot")
+READY = Gauge("graphrag_ready", "1 once startup warm-up has finished")
+
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request_timings():
+    """Begin collecting spans for the current request; returns the span list."""
+    timings = []
+    _request_timings.set(timings)
+    return timings
+
+def _add_span(span):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append(span)
+
+def record_stage(stage, seconds, **attributes):
+    STAGE_SECONDS.labels(stage=stage).observe(seconds)
+    _add_span({"stage": stage, "ms": round(seconds * 1000, 2), **attributes})
+
+@contextmanager
+def stage_timer(stage, **attributes):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage=stage).inc()
+        raise
+    finally:
+        record_stage(stage, time.perf_counter() - start, **attributes)
+
+def timed(stage):
+    """Decorator form of `stage_timer` for sync and async functions."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage_timer(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class LLMSpan:
+    """Timing and size statistics for one LLM call."""
+
+    def __init__(self, prompt):
+        self.prompt_chars = len(prompt)
+        self.start = time.perf_counter()
+        self.ttft = None
+
+    def first_token(self):
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.start
+
+    def finish(self, response=None):
+        """Record the span; `response` is the final Ollama message carrying eval stats."""
+        seconds = time.perf_counter() - self.start
+        stats = {"prompt_chars": self.prompt_chars}
+        LLM_PROMPT_CHARS.observe(self.prompt_chars)
+
+        get = response.get if response is not None and hasattr(response, "get") else (lambda key: None)
+        prompt_tokens = get("prompt_eval_count")
+        eval_count, eval_duration = get("eval_count"), get("eval_duration")
+
+        if self.ttft is None and get("prompt_eval_duration") is not None:
+            # Non-streaming call: Ollama's load + prefill time is the time to first token
+            self.ttft = ((get("load_duration") or 0) + get("prompt_eval_duration")) / 1e9
+        if self.ttft is not None:
+            LLM_TTFT_SECONDS.observe(self.ttft)
+            stats["ttft_ms"] = round(self.ttft * 1000, 2)
+        if prompt_tokens:
+            LLM_PROMPT_TOKENS.observe(prompt_tokens)
+            stats["prompt_tokens"] = prompt_tokens
+        if eval_count and eval_duration:
+            tokens_per_second = eval_count / (eval_duration / 1e9)
+            LLM_TOKENS_PER_SECOND.observe(tokens_per_second)
+            stats["completion_tokens"] = eval_count
+            stats["tokens_per_sec"] = round(tokens_per_second, 2)
+
+        record_stage("llm", seconds, **stats)
+
+
+def metrics_payload():
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -2,34 +2,102 @@ import os
 import re
 import fitz
 import json
+import time
+import hashlib
+import argparse
 from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from unidecode import unidecode
+from artifacts import load_records, write_records
 
-def extract_text_by_page(pdf_path: str):
+CONTROL_CHARS = re.compile(r'[\u0000-\u001F\u007F]')
+DOT_LEADERS = re.compile(r'\.{5,}\s*\d*')
+WHITESPACE = re.compile(r'\s+')
+
+def clean_page_text(text):
+    """Normalize raw page text to single-spaced ASCII."""
+    text = unidecode(text)
+    text = CONTROL_CHARS.sub('', text)
+    # Only pay for the escape round trip when there is something to unescape
+    if '\\' in text:
+        text = text.encode().decode("unicode_escape")
+    text = text.replace('\"', '\'')
+    text = DOT_LEADERS.sub('', text)
+    return WHITESPACE.sub(' ', text).strip()
+
+def extracted_path(pdf_path, output_dir="./data/extracted_pdfs"):
+    return os.path.join(output_dir, f"{Path(pdf_path).stem}_extracted.jsonl.gz")
+
+def extract_text_by_page(pdf_path: str, output_dir: str = "./data/extracted_pdfs"):
     """
         Extracts text page by page from a PDF.
         Returns: list of {"page": int, "text": str}
     """
-    doc = fitz.open(pdf_path)
-    pages = []
-    for i, page in enumerate(doc):
-        text = page.get_text("text")
-        text = unidecode(text)
-        text = re.sub(r'[\u0000-\u001F\u007F]', '', text)
-        text = text.encode().decode("unicode_escape")
-        text = text.replace('\"', '\'')
-        text = re.sub(r'\.{5,}\s*\d*', '', text)
-        text = re.sub(r'\s+', ' ', text).strip()
-        cleaned_text = ' '.join(text.split())
-        pages.append({"page": i + 1, "text": cleaned_text, "source": Path(pdf_path).name})
-
-    doc.close()
-    with open(f"./data/extracted_pdfs/{Path(pdf_path).stem}_extracted.json", "w", encoding="utf-16") as f:
-        json.dump(pages, f, indent=4)
-    return pages
-
-files = os.listdir("./data/raw_pdfs")
-pdf_files = [f for f in files if f.endswith(".pdf")]
-
-for pdf_file in pdf_files:
-    extract_text_by_page(os.path.join("./data/raw_pdfs", pdf_file))
\ No newline at end of file
+    ingest_pdf(pdf_path, output_dir)
+    return load_records(extracted_path(pdf_path, output_dir))
+
+def ingest_pdf(pdf_path: str, output_dir: str = "./data/extracted_pdfs"):
+    """
+        Single pass over one PDF: reads the file once, hashes it, and streams
+        cleaned page records to the extracted artifact as each page is done.
+        Returns: file metadata (hash, page count, ...) without the page text
+    """
+    with open(pdf_path, "rb") as f:
+        data = f.read()
+
+    name = Path(pdf_path).name
+    output_path = extracted_path(pdf_path, output_dir)
+    doc = fitz.open(stream=data, filetype="pdf")
+    try:
+        write_records(output_path, (
+            {"page": i + 1, "text": clean_page_text(page.get_text("text")), "source": name}
+            for i, page in enumerate(doc)
+        ))
+        page_count = doc.page_count
+    finally:
+        doc.close()
+
+    return {
+        "file_id": f"file_{Path(pdf_path).stem}",
+        "name": name,
+        "path": os.path.abspath(pdf_path),
+        "size": len(data),
+        "created_at": datetime.fromtimestamp(os.path.getctime(pdf_path)).isoformat(),
+        "type": "pdf",
+        "json_file": name.replace(".pdf", ".json"),
+        "hash": hashlib.sha256(data).hexdigest(),
+        "pages": page_count,
+        "extracted_path": output_path
+    }
+
+def ingest_pdfs(pdf_paths, output_dir="./data/extracted_pdfs", workers=None):
+    """Ingest PDFs across a process pool. Returns metadata in input order."""
+    results = {}
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(ingest_pdf, path, output_dir): path for path in pdf_paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                results[path] = future.result()
+                print(f"✅ {Path(path).name}: {results[path]['pages']} pages")
+            except Exception as e:
+                print(f"❌ Could not ingest {path}: {e}")
+
+    print(f"📊 Ingested {len(results)}/{len(pdf_paths)} PDFs in {time.time() - start_time:.2f} seconds")
+    return [results[path] for path in pdf_paths if path in results]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract cleaned page text, hashes and page counts from PDFs")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    files = os.listdir("./data/raw_pdfs")
+    pdf_files = [os.path.join("./data/raw_pdfs", f) for f in files if f.endswith(".pdf")]
+
+    metadata = ingest_pdfs(pdf_files, workers=args.workers)
+
+    with open("./file_metadata.json", "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    print("✅ Metadata saved to ./file_metadata.json")
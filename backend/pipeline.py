@@ -0,0 +1,277 @@
+"""
+Incremental ingestion pipeline.
+
+Replaces running pdf_scraper.py -> group_all_chunks.py -> create_chunks.py ->
+triplet_creation.py -> db_creation.py by hand. Every stage output is keyed
+on content hashes:
+
+- documents on the SHA256 of the PDF plus the chunking configuration
+- triplets on the hash of the chunk text, extraction prompt and model
+
+so only new or changed PDFs are re-extracted and re-chunked, only chunk
+texts never seen before go to the LLM, and only the affected documents are
+deleted from and re-inserted into Neo4j.
+"""
+import os
+import json
+import hashlib
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import warnings
+warnings.filterwarnings("ignore")
+
+from file_metadata import file_sha256
+from artifacts import iter_records, load_records, write_records
+from pdf_scraper import ingest_pdfs
+from create_chunks import stream_chunks, CHUNK_SIZE, CHUNK_OVERLAP, STREAM_WINDOW, CHUNKER_VERSION
+import triplet_creation
+import db_creation
+from entity_summaries import update_summaries
+
+RAW_PDF_DIR = "./data/raw_pdfs"
+EXTRACTED_DIR = "./data/extracted_pdfs"
+CHUNKS_PATH = "./essentials/all_chunks.json"
+TRIPLETS_PATH = "./essentials/knowledge_triplets.json"
+FILE_METADATA_PATH = "./essentials/file_metadata.json"
+MANIFEST_PATH = "./essentials/pipeline_manifest.json"
+TRIPLET_CACHE_PATH = "./essentials/triplet_cache.jsonl"
+
+def source_name(pdf_file):
+    """Name used for a document's File node and its chunks' `source`."""
+    return f"{Path(pdf_file).stem}_extracted.pdf"
+
+def chunking_config():
+    """Everything that determines chunk boundaries; part of each document key,
+    so chunk ids (served as immutable) never get different text."""
+    return {"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP,
+            "stream_window": STREAM_WINDOW, "chunker_version": CHUNKER_VERSION}
+
+def extractor_fingerprint():
+    """Hash of everything besides the chunk text that determines extracted triplets."""
+    payload = json.dumps({
+        "model": triplet_creation.llm.model,
+        "prompt": triplet_creation.triplet_prompt.template
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def triplet_cache_key(text, fingerprint):
+    return hashlib.sha256(f"{fingerprint}\n{text}".encode("utf-8")).hexdigest()
+
+def document_key(pdf_hash):
+    return hashlib.sha256(json.dumps([pdf_hash, chunking_config()]).encode("utf-8")).hexdigest()
+
+def make_chunk_id(doc_key, index):
+    return f"chunk_{hashlib.sha256(f'{doc_key}:{index}'.encode('utf-8')).hexdigest()[:16]}"
+
+
+# --- Artifacts ---
+def load_json(path, encoding="utf-8", default=None):
+    try:
+        with open(path, "r", encoding=encoding) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+def save_json(path, data, encoding="utf-8"):
+    with open(path, "w", encoding=encoding) as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+
+def bootstrap_manifest(pdf_hashes, chunks, triplets, fingerprint, seed_cache=True):
+    """
+    Build a manifest from artifacts produced by the manual scripts, treating
+    them as current for the PDFs on disk, and seed the triplet cache with
+    their extractions so the first incremental run has nothing to redo.
+    """
+    chunks_by_source = {}
+    for c in chunks:
+        chunks_by_source.setdefault(c["source"], []).append(c["id"])
+
+    documents = {}
+    for pdf_file, pdf_hash in pdf_hashes.items():
+        source = source_name(pdf_file)
+        if source in chunks_by_source:
+            documents[pdf_file] = {
+                "key": document_key(pdf_hash),
+                "source": source,
+                "chunk_ids": chunks_by_source[source]
+            }
+
+    text_by_chunk = {c["id"]: c["text"] for c in chunks}
+    by_key = {}
+    for t in triplets:
+        chunk_id = db_creation.chunk_id_from_triplet_id(t["triplet_id"])
+        if chunk_id in text_by_chunk:
+            by_key.setdefault(triplet_cache_key(text_by_chunk[chunk_id], fingerprint), []).append(
+                {"subject": t["subject"], "relation": t["relation"], "object": t["object"]}
+            )
+    if seed_cache:
+        with open(TRIPLET_CACHE_PATH, "a", encoding="utf-8") as f:
+            for key, key_triplets in by_key.items():
+                triplet_creation.append_checkpoint(f, {"chunk_id": key, "status": "ok", "triplets": key_triplets})
+
+    print(f"📋 Bootstrapped manifest for {len(documents)} documents and {len(by_key)} cached extractions")
+    return {"documents": documents}
+
+
+# --- Stages ---
+def chunk_document(pdf_path, pages_path, doc_key):
+    """Chunk one extracted PDF, returning chunk records with content-derived
+    IDs and the pages each chunk spans."""
+    source = source_name(pdf_path)
+    return [{"id": make_chunk_id(doc_key, i), "text": text, "source": source,
+             "page_start": page_start, "page_end": page_end}
+            for i, (text, page_start, page_end) in enumerate(stream_chunks(iter_records(pages_path)))]
+
+UPSERT_FILES_QUERY = """
+UNWIND $rows AS row
+MERGE (f:File {name: row.name})
+ON CREATE SET f.file_id = row.file_id
+SET f.url = coalesce(row.url, f.url),
+    f.description = coalesce(row.description, f.description)
+"""
+
+def apply_delta(stale_sources, files, chunks, triplets, batch_size, removed_sources=()):
+    """Remove stale documents (and the File nodes of `removed_sources`) from Neo4j and insert the new ones."""
+    aliases = db_creation.load_aliases()
+    triplets = db_creation.apply_aliases(triplets, aliases)
+    with db_creation.driver.session() as session:
+        db_creation.create_schema(session)
+
+        for source in stale_sources:
+            session.write_transaction(delete_source, source)
+        for source in removed_sources:
+            session.write_transaction(delete_file, source)
+        if stale_sources:
+            session.write_transaction(delete_orphan_entities)
+
+        db_creation.bulk_write(session, UPSERT_FILES_QUERY, files, batch_size, "files")
+        db_creation.bulk_write(session, db_creation.BULK_CHUNKS_QUERY, db_creation.chunk_rows(chunks), batch_size, "chunks")
+        db_creation.bulk_write(session, db_creation.BULK_TRIPLETS_QUERY, db_creation.triplet_rows(triplets), batch_size, "triplets")
+        if aliases:
+            # Also folds nodes of unchanged documents still stored under an alias
+            db_creation.merge_alias_entities(session, aliases, batch_size)
+
+        session.write_transaction(db_creation.stamp_graph_version)
+
+def delete_source(tx, source):
+    tx.run("MATCH (c:Chunk {source: $source}) DETACH DELETE c", source=source)
+    tx.run("MATCH ()-[r:RELATION {source: $source}]->() DELETE r", source=source)
+
+def delete_file(tx, source):
+    tx.run("MATCH (f:File {name: $source}) DETACH DELETE f", source=source)
+
+def delete_orphan_entities(tx):
+    tx.run("MATCH (e:Entity) WHERE NOT (e)--() DELETE e")
+
+
+def run_pipeline(workers=4, pdf_workers=None, batch_size=1000, dry_run=False):
+    fingerprint = extractor_fingerprint()
+    chunks = load_records(CHUNKS_PATH, default=[])
+    triplets = load_records(TRIPLETS_PATH, default=[])
+
+    pdf_files = sorted(f for f in os.listdir(RAW_PDF_DIR) if f.endswith(".pdf"))
+    pdf_hashes = {f: file_sha256(os.path.join(RAW_PDF_DIR, f)) for f in pdf_files}
+
+    manifest = load_json(MANIFEST_PATH, encoding="utf-8")
+    if manifest is None:
+        manifest = bootstrap_manifest(pdf_hashes, chunks, triplets, fingerprint, seed_cache=not dry_run)
+        if not dry_run:
+            save_json(MANIFEST_PATH, manifest, encoding="utf-8")
+    documents = manifest["documents"]
+
+    changed = [f for f in pdf_files
+               if documents.get(f, {}).get("key") != document_key(pdf_hashes[f])]
+    removed = [f for f in documents if f not in pdf_hashes]
+
+    print(f"📊 {len(pdf_files)} PDFs: {len(changed)} new or changed, {len(removed)} removed")
+    for f in changed:
+        print(f"  ➕ {f}")
+    for f in removed:
+        print(f"  ➖ {f}")
+    if not changed and not removed:
+        print("✅ Knowledge graph is up to date")
+        return
+    if dry_run:
+        return
+
+    # Extract and chunk new or changed documents in parallel
+    ingested = ingest_pdfs([os.path.join(RAW_PDF_DIR, f) for f in changed], EXTRACTED_DIR, workers=pdf_workers)
+    extracted = {meta["name"]: meta["extracted_path"] for meta in ingested}
+    changed = [f for f in changed if f in extracted]
+
+    new_chunks = []
+    doc_keys = [document_key(pdf_hashes[f]) for f in changed]
+    chunks_by_document = {}
+    with ProcessPoolExecutor(max_workers=pdf_workers) as executor:
+        chunked = executor.map(chunk_document, changed, [extracted[f] for f in changed], doc_keys)
+        for f, doc_chunks in zip(changed, chunked):
+            chunks_by_document[f] = doc_chunks
+            new_chunks.extend(doc_chunks)
+            print(f"  ✂️ {f}: {len(doc_chunks)} chunks")
+
+    # Extract triplets only for chunk texts not seen before
+    key = lambda chunk: triplet_cache_key(chunk["text"], fingerprint)
+    done = triplet_creation.extract_triplets_concurrently(new_chunks, TRIPLET_CACHE_PATH, workers=workers, key=key)
+
+    new_triplets = []
+    for chunk in new_chunks:
+        for i, t in enumerate(done.get(key(chunk), [])):
+            # Chunk ids are content-addressed, so this id is stable across runs
+            new_triplets.append({**t, "source": chunk["source"], "triplet_id": f"{chunk['id']}_{i}"})
+
+    # Apply the delta to Neo4j
+    stale_sources = {source_name(f) for f in changed + removed}
+    file_metadata = {m["name"]: m for m in load_json(FILE_METADATA_PATH, encoding="utf-8", default=[])}
+    files = [{"file_id": f"file_{Path(f).stem}", "name": source_name(f),
+              "url": file_metadata.get(source_name(f), {}).get("url"),
+              "description": file_metadata.get(source_name(f), {}).get("description")}
+             for f in changed]
+    apply_delta(stale_sources, files, new_chunks, new_triplets, batch_size,
+                removed_sources={source_name(f) for f in removed})
+
+    # Rewrite the artifacts consumed by the manual scripts
+    chunks = [c for c in chunks if c["source"] not in stale_sources] + new_chunks
+    triplets = [t for t in triplets if t["source"] not in stale_sources] + new_triplets
+    write_records(CHUNKS_PATH, chunks, key="id")
+    write_records(TRIPLETS_PATH, triplets, key="triplet_id")
+
+    # Rebuild the context blocks of entities whose neighborhood changed
+    with db_creation.driver.session() as session:
+        update_summaries(session, chunks, triplets, batch_size=batch_size)
+        # Restamp so results cached before the blocks landed are dropped
+        session.write_transaction(db_creation.stamp_graph_version)
+
+    # A document is only current once every one of its chunks was extracted;
+    # otherwise it keeps its old key and is re-queued on the next run
+    incomplete = []
+    for f, doc_key in zip(changed, doc_keys):
+        doc_chunks = chunks_by_document[f]
+        failed = sum(1 for c in doc_chunks if key(c) not in done)
+        entry = {"key": documents.get(f, {}).get("key"), "source": source_name(f),
+                 "chunk_ids": [c["id"] for c in doc_chunks]}
+        if failed:
+            entry["pending"] = failed
+            incomplete.append(f)
+            print(f"  ⚠️ {f}: {failed} chunks failed extraction, will be retried on the next run")
+        else:
+            entry["key"] = doc_key
+        documents[f] = entry
+    for f in removed:
+        del documents[f]
+    save_json(MANIFEST_PATH, manifest, encoding="utf-8")
+
+    print(f"✅ Applied {len(new_chunks)} chunks and {len(new_triplets)} triplets for {len(changed)} documents; removed {len(removed)}")
+    if incomplete:
+        print(f"⚠️ {len(incomplete)} documents are incomplete and will be retried on the next run")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally ingest new or changed PDFs into the knowledge graph")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent triplet extraction requests")
+    parser.add_argument("--pdf-workers", type=int, default=None, help="PDF extraction processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per Neo4j UNWIND batch")
+    parser.add_argument("--dry-run", action="store_true", help="only report which documents would be processed")
+    args = parser.parse_args()
+
+    run_pipeline(workers=args.workers, pdf_workers=args.pdf_workers, batch_size=args.batch_size, dry_run=args.dry_run)
@@ -0,0 +1,92 @@
+import re
+import time
+import threading
+import unicodedata
+from cachetools import TTLCache
+
+
+def normalize_question(question):
+    """Normalize a question so trivially different phrasings share a cache key.
+    Only case, Unicode form, whitespace and trailing ?!. are ignored; operators
+    and signs ("< 5" vs "> 5", "+" vs "-") change the meaning and are kept."""
+    text = unicodedata.normalize("NFKC", question).lower()
+    text = " ".join(text.split())
+    return re.sub(r"[\s?!.]+$", "", text)
+
+
+class RetrievalCache:
+    """
+    Bounded in-process cache for retrieval results.
+
+    Entries are evicted least-recently-used once `maxsize` is reached and
+    expire after `ttl` seconds. The whole cache is dropped when the graph
+    version stamp written by db_creation.py changes; the stamp is re-read at
+    most once every `version_check_interval` seconds.
+    """
+
+    def __init__(self, maxsize=1024, ttl=600, version_check_interval=30):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.version_check_interval = version_check_interval
+        self.graph_version = None
+        self._version_checked_at = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(question, topk_entities, **options):
+        return (normalize_question(question), topk_entities, tuple(sorted(options.items())))
+
+    def get(self, key):
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._cache[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def version_check_due(self):
+        """Return True (once per interval) when the graph version should be re-read."""
+        now = time.monotonic()
+        with self._lock:
+            if (self._version_checked_at is not None
+                    and now - self._version_checked_at < self.version_check_interval):
+                return False
+            self._version_checked_at = now
+            return True
+
+    def update_graph_version(self, version):
+        """Record the current graph version, invalidating all entries if it
+        changed. Returns True when the version changed."""
+        with self._lock:
+            if version == self.graph_version:
+                return False
+            if self._cache:
+                self.invalidations += 1
+            self._cache.clear()
+            self.graph_version = version
+            return True
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._cache),
+                "maxsize": self._cache.maxsize,
+                "ttl": self._cache.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "invalidations": self.invalidations,
+                "graph_version": self.graph_version
+            }
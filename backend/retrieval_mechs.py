@@ -1,46 +1,190 @@
-from neo4j import GraphDatabase
+import os
+import json
+import asyncio
+from neo4j import GraphDatabase, AsyncGraphDatabase
+from retrieval_cache import RetrievalCache
+from singleflight import SingleFlight
+from metrics import timed, stage_timer
+import graph_engine
 
-driver = GraphDatabase.driver("bolt://localhost:7687", auth=("neo4j", "testpassword"))
+NEO4J_URI = "bolt://localhost:7687"
+NEO4J_AUTH = ("neo4j", "testpassword")
+
+# "neo4j" queries the database per request; "memory" serves from the
+# in-process CSR graph in graph_engine.py (no live database needed)
+RETRIEVAL_BACKEND = os.environ.get("GRAPH_RAG_BACKEND", "neo4j")
+
+# Use the per-entity context blocks stored by entity_summaries.py when present
+USE_ENTITY_SUMMARIES = os.environ.get("GRAPH_RAG_ENTITY_SUMMARIES", "1") != "0"
+
+driver = GraphDatabase.driver(NEO4J_URI, auth=NEO4J_AUTH)
+async_driver = AsyncGraphDatabase.driver(NEO4J_URI, auth=NEO4J_AUTH)
+
+retrieval_cache = RetrievalCache()
+retrieval_flights = SingleFlight()
+
+# --- Graph version stamp (written by db_creation.py) ---
+GRAPH_VERSION_QUERY = """
+OPTIONAL MATCH (m:GraphMeta {key: 'graph'})
+RETURN m.version AS version
+"""
+
+def get_graph_version():
+    if RETRIEVAL_BACKEND == "memory":
+        return graph_engine.get_graph().version
+
+    with driver.session() as session:
+        return session.run(GRAPH_VERSION_QUERY).single()["version"]
 
 # --- Entity-based search ---
+SEARCH_ENTITIES_QUERY = """
+CALL db.index.fulltext.queryNodes('entityIndex', $q) YIELD node, score
+RETURN node.name AS entity, score
+ORDER BY score DESC LIMIT $limit
+"""
+
+@timed("search_entities")
 def search_entities(question, limit=10):
-    query = """
-    CALL db.index.fulltext.queryNodes('entityIndex', $q) YIELD node, score
-    RETURN node.name AS entity, score
-    ORDER BY score DESC LIMIT $limit
-    """
     with driver.session() as session:
-        result = session.run(query, q=question, limit=limit)
+        result = session.run(SEARCH_ENTITIES_QUERY, q=question, limit=limit)
         return [record.data() for record in result]
 
 # --- Expand neighborhood of an entity ---
+EXPAND_ENTITY_QUERY = """
+MATCH (e:Entity {name: $entity})-[r]-(n)
+RETURN e.name AS source, type(r) AS relation, n.name AS target, r.source AS provenance
+LIMIT $limit
+"""
+
+@timed("expand_entity")
 def expand_entity(entity, limit=20):
-    query = """
-    MATCH (e:Entity {name: $entity})-[r]-(n)
-    RETURN e.name AS source, type(r) AS relation, n.name AS target, r.source AS provenance
-    LIMIT $limit
-    """
     with driver.session() as session:
-        result = session.run(query, entity=entity, limit=limit)
+        result = session.run(EXPAND_ENTITY_QUERY, entity=entity, limit=limit)
         return [record.data() for record in result]
 
 # --- Retrieve supporting chunks ---
+ENTITY_CHUNKS_QUERY = """
+MATCH (c:Chunk)-[:CONTAINS_ENTITY]->(e:Entity {name: $entity})
+RETURN c.chunk_id AS chunk_id, c.text AS text, c.source AS source
+LIMIT $limit
+"""
+
+@timed("get_chunks_for_entity")
 def get_chunks_for_entity(entity, limit=5):
-    query = """
-    MATCH (c:Chunk)-[:CONTAINS_ENTITY]->(e:Entity {name: $entity})
-    RETURN c.chunk_id AS chunk_id, c.text AS text, c.source AS source
-    LIMIT $limit
-    """
     with driver.session() as session:
-        result = session.run(query, entity=entity, limit=limit)
+        result = session.run(ENTITY_CHUNKS_QUERY, entity=entity, limit=limit)
         return [record.data() for record in result]
 
+# --- Combined retrieval: search, expansion and chunks in one statement ---
+# Entities with a stored summary block (when $use_summaries) skip the traversals
+ENTITY_CONTEXT_SUBQUERIES = """
+CALL {
+    WITH node
+    WITH node WHERE NOT $use_summaries OR node.summary IS NULL
+    MATCH (node)-[r]-(n)
+    WITH node, r, n LIMIT $neighbor_limit
+    RETURN collect({source: node.name, relation: type(r), target: n.name, provenance: r.source}) AS neighbors
+}
+CALL {
+    WITH node
+    WITH node WHERE NOT $use_summaries OR node.summary IS NULL
+    MATCH (c:Chunk)-[:CONTAINS_ENTITY]->(node)
+    WITH c LIMIT $chunk_limit
+    RETURN collect({chunk_id: c.chunk_id, text: c.text, source: c.source}) AS chunks
+}
+"""
+
+COMBINED_RETRIEVAL_QUERY = """
+CALL db.index.fulltext.queryNodes('entityIndex', $q) YIELD node, score
+WITH node, score
+ORDER BY score DESC LIMIT $limit
+""" + ENTITY_CONTEXT_SUBQUERIES + """
+RETURN node.name AS entity, neighbors, chunks, node.summary AS summary
+ORDER BY score DESC
+"""
+
+@timed("combined_retrieval")
+def retrieve_context_combined(question, topk_entities=3, neighbor_limit=20, chunk_limit=5):
+    """Run the fulltext search, neighbor expansion and chunk fetch as a single
+    query on one session, returning the same shape as `retrieve_context`."""
+    with driver.session() as session:
+        result = session.run(COMBINED_RETRIEVAL_QUERY, q=question, limit=topk_entities,
+                             neighbor_limit=neighbor_limit, chunk_limit=chunk_limit,
+                             use_summaries=USE_ENTITY_SUMMARIES)
+        return [entity_context(record.data()) for record in result]
+
+# --- Precomputed entity context (entity_summaries.py) ---
+SUMMARY_SEARCH_QUERY = """
+CALL db.index.fulltext.queryNodes('entityIndex', $q) YIELD node, score
+RETURN node.name AS entity, node.summary AS summary
+ORDER BY score DESC LIMIT $limit
+"""
+
+def summary_context(record):
+    """Retrieval result from a stored Entity.summary block."""
+    block = json.loads(record["summary"])
+    return {"entity": record["entity"], "neighbors": block["neighbors"], "chunks": block["chunks"]}
+
+def entity_context(row):
+    """Retrieval result from a row carrying both traversal results and the
+    stored summary; the summary wins when present."""
+    if USE_ENTITY_SUMMARIES and row.get("summary"):
+        return summary_context(row)
+    return {"entity": row["entity"], "neighbors": row["neighbors"], "chunks": row["chunks"]}
+
+@timed("summary_search")
+def search_entity_summaries(question, limit=10):
+    with driver.session() as session:
+        result = session.run(SUMMARY_SEARCH_QUERY, q=question, limit=limit)
+        return [record.data() for record in result]
+
+# --- Multi-hop retrieval ranked by personalized PageRank ---
+def get_memory_graph():
+    """In-memory graph used for multi-hop ranking; snapshotted from Neo4j
+    unless the app already serves from the JSON artifacts."""
+    if RETRIEVAL_BACKEND == "memory":
+        return graph_engine.get_graph()
+    return graph_engine.get_graph(loader=lambda: graph_engine.CSRGraph.from_neo4j(driver))
+
+async def async_get_memory_graph():
+    """`get_memory_graph` that loads the graph off the event loop on first use."""
+    graph = graph_engine.loaded_graph()
+    if graph is None:
+        graph = await asyncio.to_thread(get_memory_graph)
+    return graph
+
+@timed("multihop_retrieval")
+def retrieve_context_multihop(question, topk_entities=3):
+    """Seed a random walk with restart from the fulltext hits and return the
+    best-ranked facts and chunks within a few hops, instead of the first 20
+    direct neighbors of each hit."""
+    seeds = None
+    if RETRIEVAL_BACKEND != "memory":
+        seeds = search_entities(question, limit=topk_entities)
+    return get_memory_graph().retrieve_context_multihop(question, topk_entities=topk_entities, seeds=seeds)
+
 # --- Unified retrieval function ---
-def retrieve_context(question, topk_entities=3):
-    entities = search_entities(question, limit=topk_entities)
+def retrieve_context(question, topk_entities=3, combined=False, multihop=False):
+    if multihop:
+        return retrieve_context_multihop(question, topk_entities=topk_entities)
+
+    if RETRIEVAL_BACKEND == "memory":
+        with stage_timer("memory_retrieval"):
+            return graph_engine.get_graph().retrieve_context(question, topk_entities=topk_entities)
+
+    if combined:
+        return retrieve_context_combined(question, topk_entities=topk_entities)
+
+    if USE_ENTITY_SUMMARIES:
+        entities = search_entity_summaries(question, limit=topk_entities)
+    else:
+        entities = search_entities(question, limit=topk_entities)
     context = []
 
     for ent in entities:
+        if ent.get("summary"):
+            context.append(summary_context(ent))
+            continue
         entity_name = ent["entity"]
         neighbors = expand_entity(entity_name)
         chunks = get_chunks_for_entity(entity_name)
@@ -53,3 +197,217 @@ def retrieve_context(question, topk_entities=3):
 
     return context
 
+
+# --- Async retrieval (non-blocking, for the FastAPI app) ---
+async def _async_run(query, **params):
+    async with async_driver.session() as session:
+        result = await session.run(query, **params)
+        return await result.data()
+
+@timed("search_entities")
+async def async_search_entities(question, limit=10):
+    return await _async_run(SEARCH_ENTITIES_QUERY, q=question, limit=limit)
+
+@timed("expand_entity")
+async def async_expand_entity(entity, limit=20):
+    return await _async_run(EXPAND_ENTITY_QUERY, entity=entity, limit=limit)
+
+@timed("get_chunks_for_entity")
+async def async_get_chunks_for_entity(entity, limit=5):
+    return await _async_run(ENTITY_CHUNKS_QUERY, entity=entity, limit=limit)
+
+async def _async_entity_context(entity_name):
+    neighbors, chunks = await asyncio.gather(
+        async_expand_entity(entity_name),
+        async_get_chunks_for_entity(entity_name),
+    )
+    return {
+        "entity": entity_name,
+        "neighbors": neighbors,
+        "chunks": chunks
+    }
+
+async def _async_summary_or_traverse(ent):
+    if ent.get("summary"):
+        return summary_context(ent)
+    return await _async_entity_context(ent["entity"])
+
+@timed("multihop_retrieval")
+async def async_retrieve_context_multihop(question, topk_entities=3):
+    seeds = None
+    if RETRIEVAL_BACKEND != "memory":
+        seeds = await async_search_entities(question, limit=topk_entities)
+    # The first call may snapshot the graph from Neo4j; keep that off the event loop
+    graph = await async_get_memory_graph()
+    return graph.retrieve_context_multihop(question, topk_entities=topk_entities, seeds=seeds)
+
+async def async_retrieve_context(question, topk_entities=3, combined=False, multihop=False):
+    """Async counterpart of `retrieve_context`. Per-entity expansion and chunk
+    fetches are issued concurrently, each on its own pooled session."""
+    if multihop:
+        return await async_retrieve_context_multihop(question, topk_entities=topk_entities)
+
+    if RETRIEVAL_BACKEND == "memory":
+        # Array lookups only once the graph is loaded
+        graph = await async_get_memory_graph()
+        with stage_timer("memory_retrieval"):
+            return graph.retrieve_context(question, topk_entities=topk_entities)
+
+    if combined:
+        with stage_timer("combined_retrieval"):
+            rows = await _async_run(COMBINED_RETRIEVAL_QUERY, q=question, limit=topk_entities,
+                                    neighbor_limit=20, chunk_limit=5, use_summaries=USE_ENTITY_SUMMARIES)
+        return [entity_context(row) for row in rows]
+
+    if USE_ENTITY_SUMMARIES:
+        with stage_timer("summary_search"):
+            entities = await _async_run(SUMMARY_SEARCH_QUERY, q=question, limit=topk_entities)
+    else:
+        entities = await async_search_entities(question, limit=topk_entities)
+
+    # Traverse for entities without a stored block
+    return list(await asyncio.gather(
+        *(_async_summary_or_traverse(ent) for ent in entities)
+    ))
+
+
+# --- Chunk lookup ---
+CHUNK_BY_ID_QUERY = """
+MATCH (c:Chunk {chunk_id: $chunk_id})
+RETURN c.chunk_id AS chunk_id, c.text AS text, c.source AS source
+"""
+
+async def async_get_chunk(chunk_id):
+    """Fetch a single chunk by id, or None."""
+    if RETRIEVAL_BACKEND == "memory":
+        graph = graph_engine.loaded_graph()
+        if graph is None:
+            # Read just this chunk through the artifact index instead of loading the graph
+            try:
+                return await asyncio.to_thread(graph_engine.get_artifact_chunk, chunk_id)
+            except (FileNotFoundError, ValueError):
+                graph = await async_get_memory_graph()
+        return graph.get_chunk(chunk_id)
+    records = await _async_run(CHUNK_BY_ID_QUERY, chunk_id=chunk_id)
+    return records[0] if records else None
+
+
+# --- Batch retrieval ---
+BATCH_SEARCH_ENTITIES_QUERY = """
+UNWIND range(0, size($questions) - 1) AS i
+CALL {
+    WITH i
+    CALL db.index.fulltext.queryNodes('entityIndex', $questions[i]) YIELD node, score
+    RETURN node.name AS entity, score
+    ORDER BY score DESC LIMIT $limit
+}
+RETURN i, collect(entity) AS entities
+"""
+
+BATCH_ENTITY_CONTEXT_QUERY = """
+UNWIND $entities AS name
+MATCH (node:Entity {name: name})
+""" + ENTITY_CONTEXT_SUBQUERIES + """
+RETURN node.name AS entity, neighbors, chunks, node.summary AS summary
+"""
+
+@timed("batch_retrieval")
+async def async_batch_retrieve_context(questions, topk_entities=3):
+    """
+    Retrieval for many questions at once: one fulltext search statement for
+    all questions, then one expansion statement over the distinct entities,
+    so an entity shared by several questions is fetched only once.
+    Returns: a list of retrievals per question, in input order
+    """
+    if RETRIEVAL_BACKEND == "memory":
+        graph = await async_get_memory_graph()
+        per_question = [[e["entity"] for e in graph.search_entities(q, limit=topk_entities)] for q in questions]
+        distinct = dict.fromkeys(name for names in per_question for name in names)
+        contexts = {name: {"entity": name,
+                           "neighbors": graph.expand_entity(name),
+                           "chunks": graph.get_chunks_for_entity(name)}
+                    for name in distinct}
+    else:
+        per_question = [[] for _ in questions]
+        for row in await _async_run(BATCH_SEARCH_ENTITIES_QUERY, questions=list(questions), limit=topk_entities):
+            per_question[row["i"]] = row["entities"]
+        distinct = list(dict.fromkeys(name for names in per_question for name in names))
+        rows = await _async_run(BATCH_ENTITY_CONTEXT_QUERY, entities=distinct, neighbor_limit=20, chunk_limit=5,
+                                use_summaries=USE_ENTITY_SUMMARIES)
+        contexts = {row["entity"]: entity_context(row) for row in rows}
+
+    return [[contexts[name] for name in names if name in contexts] for names in per_question]
+
+
+# --- Follow-up retrieval ---
+@timed("followup_retrieval")
+async def async_followup_retrieve_context(question, previous, topk_entities=3, max_entities=15):
+    """
+    Retrieval for a follow-up turn that reuses the previous turn's context.
+    Only the follow-up question itself is searched, and only entities not
+    already in `previous` are expanded; they are merged ahead of the
+    previous turn's entities, keeping at most `max_entities`.
+    """
+    known = {r["entity"]: r for r in previous}
+
+    if RETRIEVAL_BACKEND == "memory":
+        graph = await async_get_memory_graph()
+        names = [e["entity"] for e in graph.search_entities(question, limit=topk_entities)]
+        fresh = {name: {"entity": name,
+                        "neighbors": graph.expand_entity(name),
+                        "chunks": graph.get_chunks_for_entity(name)}
+                 for name in names if name not in known}
+    else:
+        names = [e["entity"] for e in await async_search_entities(question, limit=topk_entities)]
+        new = [name for name in names if name not in known]
+        fresh = dict(zip(new, await asyncio.gather(*(_async_entity_context(name) for name in new))))
+
+    mentioned = [fresh.get(name) or known[name] for name in names]
+    mentioned_names = set(names)
+    rest = [r for r in previous if r["entity"] not in mentioned_names]
+    return (mentioned + rest)[:max_entities]
+
+
+# --- Cached retrieval ---
+def _on_graph_version(version):
+    if retrieval_cache.update_graph_version(version) and RETRIEVAL_BACKEND != "memory":
+        # Drop the multi-hop snapshot so it is reloaded from the new graph
+        graph_engine.set_graph(None)
+
+def cached_retrieve_context(question, topk_entities=3, combined=False, multihop=False):
+    """`retrieve_context` behind the in-process retrieval cache."""
+    if retrieval_cache.version_check_due():
+        _on_graph_version(get_graph_version())
+
+    key = retrieval_cache.make_key(question, topk_entities, combined=combined, multihop=multihop)
+    context = retrieval_cache.get(key)
+    if context is None:
+        context = retrieve_context(question, topk_entities=topk_entities, combined=combined, multihop=multihop)
+        retrieval_cache.set(key, context)
+    return context
+
+async def async_get_graph_version():
+    if RETRIEVAL_BACKEND == "memory":
+        return (await async_get_memory_graph()).version
+
+    records = await _async_run(GRAPH_VERSION_QUERY)
+    return records[0]["version"] if records else None
+
+async def async_cached_retrieve_context(question, topk_entities=3, combined=False, multihop=False):
+    """`async_retrieve_context` behind the in-process retrieval cache."""
+    if retrieval_cache.version_check_due():
+        _on_graph_version(await async_get_graph_version())
+
+    key = retrieval_cache.make_key(question, topk_entities, combined=combined, multihop=multihop)
+    context = retrieval_cache.get(key)
+    if context is not None:
+        return context
+
+    async def retrieve():
+        context = await async_retrieve_context(question, topk_entities=topk_entities,
+                                               combined=combined, multihop=multihop)
+        retrieval_cache.set(key, context)
+        return context
+
+    # Concurrent misses for the same question share one retrieval
+    return await retrieval_flights.do(key, retrieve)
@@ -1,44 +1,51 @@
 from retrieval_mechs import retrieve_context
+from metrics import timed, LLMSpan
+from context_packer import pack_context
+from answer_cache import answer_cache_from_env
+from singleflight import SingleFlight
+from admission import admission_from_env
 import ollama
+import os
 import json
 import sys
 import time
 
 
-def format_context(retrievals):
-    """Format retrieval results into a readable context string."""
+@timed("format_context")
+def format_context(retrievals, question=None, budget=None):
+    """Format retrieval results into a readable context string, deduplicated
+    and packed into the context token budget in order of relevance."""
     if not retrievals:
         return "No relevant context found in the knowledge graph."
-    
-    context_str = ""
-    for r in retrievals:
-        context_str += f"\n🔍 Entity: {r['entity']}\n"
-
-        # Neighbors (triplets)
-        if r['neighbors']:
-            context_str += "  📊 Relations:\n"
-            for n in r['neighbors']:
-                if n["target"]:
-                    context_str += f"    • ({n['source']}) -[{n['relation']}]-> ({n['target']}) [📄 {n['provenance']}]\n"
-
-        # Chunks
-        if r['chunks']:
-            context_str += "  📝 Supporting Text:\n"
-            for c in r['chunks']:
-                # Better text trimming with ellipsis handling
-                text_preview = c['text'][:300].strip()
-                if len(c['text']) > 300:
-                    text_preview += "..."
-                context_str += f"    • {text_preview}\n"
 
+    context_str, _ = pack_context(retrievals, question, budget)
     return context_str
 
 
-def answer_with_graph_rag_llama(question, retrievals):
-    """Generate an answer using the knowledge graph context and LLM."""
-    context = format_context(retrievals)
+LLM_MODEL = "llama3"
+LLM_OPTIONS = {
+    "temperature": 0.1,
+    "top_p": 0.9,
+    "stop": ["Question:", "Context:", "Answer:"]
+}
+# How long Ollama keeps the model loaded after a call (preloaded by warmup.py)
+LLM_KEEP_ALIVE = os.environ.get("GRAPH_RAG_LLM_KEEP_ALIVE", "30m")
+
+# Bump whenever the prompt template changes so cached answers are not reused
+PROMPT_VERSION = "1"
+
+async_client = ollama.AsyncClient()
+answer_cache = answer_cache_from_env()
+answer_flights = SingleFlight()
+llm_admission = admission_from_env()
+
+
+def build_prompt(question, retrievals, context=None):
+    """Build the grounded LLM prompt for a question and its retrievals."""
+    if context is None:
+        context = format_context(retrievals, question)
 
-    prompt = f"""You are a helpful biomedical assistant with access to a structured medical knowledge graph.
+    return f"""You are a helpful biomedical assistant with access to a structured medical knowledge graph.
 
     Your task is to answer the user's question using the provided knowledge graph context and supporting documents.
 
@@ -62,37 +69,200 @@ def answer_with_graph_rag_llama(question, retrievals):
     Now provide a clear, well-structured answer grounded in the context above.
     """
 
+
+def lookup_answer(question, retrievals):
+    """Pack the context and check the answer cache.
+    Returns: (context, cache key, cached answer or None)"""
+    context = format_context(retrievals, question)
+    cache_key = answer_cache.make_key(question, context, LLM_MODEL, PROMPT_VERSION, LLM_OPTIONS)
+    return context, cache_key, answer_cache.get(cache_key)
+
+async def async_lookup_answer(question, retrievals):
+    """`lookup_answer` without blocking the event loop on the disk cache."""
+    context = format_context(retrievals, question)
+    cache_key = answer_cache.make_key(question, context, LLM_MODEL, PROMPT_VERSION, LLM_OPTIONS)
+    return context, cache_key, await answer_cache.async_get(cache_key)
+
+
+def clean_answer(answer):
+    """Remove duplicate lines and formatting artifacts from an LLM answer."""
+    lines = answer.strip().split('\n')
+    cleaned_lines = []
+    seen_lines = set()
+    
+    for line in lines:
+        line = line.strip()
+        if line and line not in seen_lines:
+            cleaned_lines.append(line)
+            seen_lines.add(line)
+    
+    return '\n'.join(cleaned_lines)
+
+
+class StreamingLineDeduplicator:
+    """Incremental version of `clean_answer` for streamed output.
+
+    Text is passed through as soon as the current line can no longer turn
+    out to be a duplicate, i.e. once it stops being a prefix of a line that
+    was already emitted. Concatenating everything returned by `feed` and
+    `flush` gives the same result as `clean_answer` on the full text.
+    """
+
+    def __init__(self):
+        self.seen_lines = set()
+        self.current = ""
+        self.emitted = 0
+        self.has_output = False
+
+    def feed(self, text):
+        out = []
+        for i, part in enumerate(text.split('\n')):
+            if i > 0:
+                out.append(self._end_line())
+            self.current += part
+            out.append(self._emit_partial())
+        return ''.join(out)
+
+    def flush(self):
+        return self._end_line()
+
+    def _emit_upto(self, line):
+        piece = line[self.emitted:]
+        if not piece:
+            return ""
+        separator = '\n' if self.emitted == 0 and self.has_output else ""
+        self.emitted = len(line)
+        self.has_output = True
+        return separator + piece
+
+    def _emit_partial(self):
+        candidate = self.current.strip()
+        if not candidate:
+            return ""
+        if self.emitted == 0 and any(seen.startswith(candidate) for seen in self.seen_lines):
+            return ""
+        return self._emit_upto(candidate)
+
+    def _end_line(self):
+        line = self.current.strip()
+        out = ""
+        if line and (self.emitted > 0 or line not in self.seen_lines):
+            out = self._emit_upto(line)
+            self.seen_lines.add(line)
+        self.current = ""
+        self.emitted = 0
+        return out
+
+
+def answer_with_graph_rag_llama(question, retrievals):
+    """Generate an answer using the knowledge graph context and LLM."""
+    context, cache_key, cached = lookup_answer(question, retrievals)
+    if cached is not None:
+        return cached
+    prompt = build_prompt(question, retrievals, context)
+
     try:
+        span = LLMSpan(prompt)
         response = ollama.chat(
-            model="llama3",
+            model=LLM_MODEL,
             messages=[{"role": "user", "content": prompt}],
-            options={
-                "temperature": 0.1,
-                "top_p": 0.9,
-                "stop": ["Question:", "Context:", "Answer:"]
-            }
+            options=LLM_OPTIONS,
+            keep_alive=LLM_KEEP_ALIVE
         )
-        
-        # Clean up the response
-        answer = response['message']['content'].strip()
-        
-        # Remove any duplicate text or formatting artifacts
-        lines = answer.split('\n')
-        cleaned_lines = []
-        seen_lines = set()
-        
-        for line in lines:
-            line = line.strip()
-            if line and line not in seen_lines:
-                cleaned_lines.append(line)
-                seen_lines.add(line)
-        
-        return '\n'.join(cleaned_lines)
+        span.finish(response)
+        answer = clean_answer(response['message']['content'])
+        answer_cache.set(cache_key, answer)
+        return answer
         
     except Exception as e:
         return f"❌ Error generating answer: {str(e)}"
 
 
+async def async_answer_with_graph_rag_llama(question, retrievals, priority="chat"):
+    """Async counterpart of `answer_with_graph_rag_llama`; awaits Ollama
+    without blocking the event loop. Concurrent requests for the same
+    question and context share one generation, which waits for an LLM slot
+    at the given priority (raises AdmissionRejected when none is free)."""
+    context, cache_key, cached = await async_lookup_answer(question, retrievals)
+    if cached is not None:
+        return cached
+    prompt = build_prompt(question, retrievals, context)
+
+    async def generate():
+        async with llm_admission.slot(priority):
+            return await _generate()
+
+    async def _generate():
+        try:
+            span = LLMSpan(prompt)
+            response = await async_client.chat(
+                model=LLM_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                options=LLM_OPTIONS,
+                keep_alive=LLM_KEEP_ALIVE
+            )
+            span.finish(response)
+            answer = clean_answer(response['message']['content'])
+            await answer_cache.async_set(cache_key, answer)
+            return answer
+
+        except Exception as e:
+            return f"❌ Error generating answer: {str(e)}"
+
+    return await answer_flights.do(cache_key, generate)
+
+
+async def async_stream_answer_with_graph_rag_llama(question, retrievals, priority="chat"):
+    """Stream the answer as Ollama produces it, yielding deduplicated text
+    pieces as soon as they are safe to send. Concurrent requests for the
+    same question and context share one generation; late joiners first
+    receive the pieces produced so far."""
+    context, cache_key, cached = await async_lookup_answer(question, retrievals)
+    if cached is not None:
+        yield cached
+        return
+    prompt = build_prompt(question, retrievals, context)
+
+    async def generate():
+        async with llm_admission.slot(priority):
+            async for piece in _generate():
+                yield piece
+
+    async def _generate():
+        dedup = StreamingLineDeduplicator()
+        pieces = []
+        try:
+            span = LLMSpan(prompt)
+            last_part = None
+            stream = await async_client.chat(
+                model=LLM_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                options=LLM_OPTIONS,
+                keep_alive=LLM_KEEP_ALIVE,
+                stream=True
+            )
+            async for part in stream:
+                span.first_token()
+                last_part = part
+                piece = dedup.feed(part['message']['content'])
+                if piece:
+                    pieces.append(piece)
+                    yield piece
+            span.finish(last_part)
+
+            tail = dedup.flush()
+            if tail:
+                pieces.append(tail)
+                yield tail
+            await answer_cache.async_set(cache_key, ''.join(pieces))
+
+        except Exception as e:
+            yield f"❌ Error generating answer: {str(e)}"
+
+    async for piece in answer_flights.stream(cache_key, generate):
+        yield piece
+
+
 def interactive_qa_session():
     """Run an interactive question-answering session."""
     print("🧬 Biomedical Knowledge Graph RAG System")
@@ -144,7 +314,7 @@ def interactive_qa_session():
             if show_context in ['y', 'yes']:
                 print("\n📚 RAW CONTEXT:")
                 print("-" * 30)
-                print(format_context(retrievals))
+                print(format_context(retrievals, question))
                 print("\n")
                 
         except KeyboardInterrupt:
@@ -0,0 +1,96 @@
+import asyncio
+
+
+class Broadcast:
+    """
+    Runs an async iterator once in its own task and replays it to any
+    number of subscribers. A subscriber that joins late first receives
+    every item produced so far, then follows along live.
+    """
+
+    def __init__(self, source):
+        self.items = []
+        self.done = False
+        self.error = None
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    async def _pump(self, source):
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def subscribe(self):
+        i = 0
+        while True:
+            changed = self._changed
+            while i < len(self.items):
+                yield self.items[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class SingleFlight:
+    """
+    In-flight deduplication of async work. Concurrent calls with the same
+    key share one execution: the first caller starts it, later callers
+    await the same result (or, for streams, subscribe to the same
+    broadcast). Work runs in its own task, so a caller that disconnects
+    does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key, func):
+        """Return `await func()`, sharing one call among concurrent callers."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._track(self._calls, key, task)
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stream(self, key, func):
+        """Iterate `func()`, sharing one iteration among concurrent callers."""
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = Broadcast(func())
+            self._track(self._streams, key, broadcast.task, broadcast)
+        else:
+            self.coalesced += 1
+        return broadcast.subscribe()
+
+    def _track(self, inflight, key, task, value=None):
+        self.started += 1
+        inflight[key] = task if value is None else value
+
+        def forget(_):
+            if inflight.get(key) is (task if value is None else value):
+                del inflight[key]
+        task.add_done_callback(forget)
+
+    def stats(self):
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "started": self.started,
+            "coalesced": self.coalesced
+        }
@@ -1,8 +1,12 @@
 from langchain_ollama import ChatOllama
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
+import os
 import json
+import argparse
 import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from artifacts import load_records, write_records
 warnings.filterwarnings("ignore")
 
 llm = ChatOllama(model="gpt-oss:20b", temperature=0)
@@ -40,98 +44,138 @@ triplet_prompt = PromptTemplate(
 
 triplet_chain = LLMChain(llm=llm, prompt=triplet_prompt)
 
-def get_last_processed_chunk_id(triplets_file_path):
-    """Get the ID of the last processed chunk from existing triplets file."""
+CHECKPOINT_PATH = "./essentials/triplet_checkpoint.jsonl"
+TRIPLETS_FILE_PATH = "./essentials/knowledge_triplets.json"
+
+
+def parse_triplets(response):
+    """Pull the JSON array of triplets out of a raw LLM response."""
+    return json.loads(response[response.find('['):response.rfind(']')+1])
+
+def extract_chunk_triplets(chunk):
+    """Run the triplet chain on one chunk and return its parsed triplets."""
+    response = triplet_chain.run(chunk=chunk["text"])
+    return parse_triplets(response)
+
+def load_checkpoint(checkpoint_path):
+    """Read the append-only checkpoint and return {chunk_id: triplets} for
+    every chunk that was extracted successfully. Later lines win."""
+    done = {}
     try:
-        with open(triplets_file_path, "r", encoding="utf-16") as f:
-            existing_triplets = json.load(f)
-        
-        if not existing_triplets:
-            return None
-        
-        chunk_ids = []
-        for triplet in existing_triplets:
-            triplet_id = triplet.get("triplet_id", "")
-            if triplet_id.startswith("chunk_"):
-                chunk_id = triplet_id.split("_")[1]
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
                 try:
-                    chunk_ids.append(int(chunk_id))
-                except ValueError:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from an interrupted run
                     continue
-        
-        return max(chunk_ids) if chunk_ids else None
+                if record.get("status") == "ok":
+                    done[record["chunk_id"]] = record["triplets"]
+                else:
+                    done.pop(record["chunk_id"], None)
+    except FileNotFoundError:
+        pass
+    return done
+
+def append_checkpoint(f, record):
+    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    f.flush()
+
+def seed_checkpoint_from_triplets(triplets_file_path, checkpoint_path):
+    """Convert a legacy knowledge_triplets.json into checkpoint records so
+    already extracted chunks are not sent to the LLM again."""
+    try:
+        existing_triplets = load_records(triplets_file_path)
     except (FileNotFoundError, json.JSONDecodeError):
-        return None
-
-def extract_triplets_from_chunks(chunks, existing_triplets=None, triplets_file_path=None):
-    """Extract triplets from chunks, resuming from last processed chunk."""
-    if existing_triplets is None:
-        existing_triplets = []
-    
-    all_triplets = existing_triplets.copy()
-    
+        return 0
+
+    by_chunk = {}
+    for t in existing_triplets:
+        chunk_id = "_".join(t["triplet_id"].split("_")[:2])
+        by_chunk.setdefault(chunk_id, []).append(
+            {"subject": t["subject"], "relation": t["relation"], "object": t["object"]}
+        )
+
+    with open(checkpoint_path, "a", encoding="utf-8") as f:
+        for chunk_id, triplets in by_chunk.items():
+            append_checkpoint(f, {"chunk_id": chunk_id, "status": "ok", "triplets": triplets})
+    return len(by_chunk)
+
+def extract_triplets_concurrently(chunks, checkpoint_path, workers=4, key=None):
+    """
+    Extract triplets for every chunk not yet in the checkpoint, keeping up
+    to `workers` LLM requests in flight. Each finished chunk is appended to
+    the checkpoint as one JSON line; failed chunks are recorded as errors
+    and picked up again on the next run.
+
+    `key` maps a chunk to its checkpoint key (the chunk ID by default) and
+    the returned dict is indexed by it.
+    """
+    if key is None:
+        key = lambda chunk: chunk["id"]
+
+    done = load_checkpoint(checkpoint_path)
+    pending = [c for c in chunks if key(c) not in done]
+    if not pending:
+        print("✅ All chunks have been processed!")
+        return done
+
+    print(f"📊 Processing {len(pending)} chunks with {workers} workers ({len(done)} already done)")
+    failed = 0
+    with open(checkpoint_path, "a", encoding="utf-8") as f, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(extract_chunk_triplets, chunk): chunk for chunk in pending}
+        for n, future in enumerate(as_completed(futures), start=1):
+            chunk = futures[future]
+            try:
+                triplets = future.result()
+                append_checkpoint(f, {"chunk_id": key(chunk), "source": chunk["source"],
+                                      "status": "ok", "triplets": triplets})
+                done[key(chunk)] = triplets
+                print(f"✅ [{n}/{len(pending)}] Extracted {len(triplets)} triplets from chunk {chunk['id']} from {chunk['source']}")
+            except Exception as e:
+                failed += 1
+                append_checkpoint(f, {"chunk_id": key(chunk), "source": chunk["source"],
+                                      "status": "error", "error": str(e)})
+                print(f"❌ [{n}/{len(pending)}] Error parsing chunk {chunk['id']}: {e}")
+
+    if failed:
+        print(f"⚠️ {failed} chunks failed and will be retried on the next run")
+    return done
+
+def export_triplets(chunks, done, triplets_file_path):
+    """Write the combined triplets file consumed by db_creation.py, in chunk order."""
+    all_triplets = []
     for chunk in chunks:
-        try:
-            response = triplet_chain.run(chunk=chunk["text"])
-            triplets = json.loads(response[response.find('['):response.rfind(']')+1])
-            for i, t in enumerate(triplets):
-                t["source"] = chunk["source"]
-                t["triplet_id"] = f"{chunk['id']}_{i}_{len(all_triplets)+1}"
-                all_triplets.append(t)
-            
-            if triplets_file_path:
-                save_triplets_incrementally(all_triplets, triplets_file_path)
-            
-            print(f"✅ Extracted and saved triplets from chunk {chunk['id']} from {chunk['source']} (Total: {len(all_triplets)})")
-        except Exception as e:
-            print(f"❌ Error parsing chunk {chunk['id']}: {e}")
-    
+        for i, t in enumerate(done.get(chunk["id"], [])):
+            t = dict(t)
+            t["source"] = chunk["source"]
+            t["triplet_id"] = f"{chunk['id']}_{i}_{len(all_triplets)+1}"
+            all_triplets.append(t)
+
+    write_records(triplets_file_path, all_triplets, key="triplet_id")
     return all_triplets
 
-def save_triplets_incrementally(triplets, triplets_file_path):
-    """Save triplets to file."""
-    with open(triplets_file_path, "w", encoding="utf-16") as f:
-        json.dump(triplets, f, indent=2, ensure_ascii=False)
-
-
-with open("./essentials/all_chunks.json", "r", encoding="utf-16") as f:
-    all_chunks = json.load(f)
-
-triplets_file_path = "./essentials/knowledge_triplets.json"
-last_processed_chunk_id = get_last_processed_chunk_id(triplets_file_path)
-
-existing_triplets = []
-try:
-    with open(triplets_file_path, "r", encoding="utf-16") as f:
-        existing_triplets = json.load(f)
-    print(f"📋 Found {len(existing_triplets)} existing triplets")
-except (FileNotFoundError, json.JSONDecodeError):
-    print("📋 No existing triplets found, starting fresh")
-
-if last_processed_chunk_id is not None:
-    start_index = last_processed_chunk_id + 1
-    print(f"🔄 Resuming from chunk {start_index} (last processed: chunk_{last_processed_chunk_id})")
-else:
-    start_index = 0
-    print("🚀 Starting from the beginning")
-
-chunks_to_process = []
-for chunk in all_chunks:
-    chunk_id = int(chunk["id"].split("_")[1])
-    if chunk_id >= start_index:
-        chunks_to_process.append(chunk)
-
-if not chunks_to_process:
-    print("✅ All chunks have been processed!")
-else:
-    print(f"📊 Processing {len(chunks_to_process)} chunks (from chunk_{start_index} to chunk_{int(all_chunks[-1]['id'].split('_')[1])})")
-    
-    all_triplets = existing_triplets
-    for i, chunk in enumerate(chunks_to_process):
-        print(f"\n🔄 Processing chunk {i+1}/{len(chunks_to_process)}: {chunk['id']}")
-        
-        all_triplets = extract_triplets_from_chunks([chunk], all_triplets, triplets_file_path)
-        
-        print(f"💾 Progress saved: {len(all_triplets)} total triplets")
-
-print("✅ Triplet extraction complete! Saved to ./essentials/knowledge_triplets.json")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract knowledge triplets from all chunks")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent requests to the LLM endpoint")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="append-only JSONL checkpoint")
+    args = parser.parse_args()
+
+    all_chunks = load_records("./essentials/all_chunks.json")
+
+    if not os.path.exists(args.checkpoint):
+        seeded = seed_checkpoint_from_triplets(TRIPLETS_FILE_PATH, args.checkpoint)
+        if seeded:
+            print(f"📋 Seeded checkpoint with {seeded} chunks from existing triplets")
+        else:
+            print("🚀 Starting from the beginning")
+
+    done = extract_triplets_concurrently(all_chunks, args.checkpoint, workers=args.workers)
+    all_triplets = export_triplets(all_chunks, done, TRIPLETS_FILE_PATH)
+
+    print(f"✅ Triplet extraction complete! {len(all_triplets)} triplets saved to {TRIPLETS_FILE_PATH}")
@@ -0,0 +1,104 @@
+"""
+Startup warm-up for the API.
+
+Runs once per process before the instance reports ready on /health:
+
+- verify Neo4j connectivity and open `GRAPH_RAG_WARMUP_CONNECTIONS`
+  pooled connections up front (the drivers otherwise connect lazily)
+- run retrieval for a few warm-up questions so the fulltext index and
+  page cache are hot (or load the CSR graph for the memory backend)
+- load the LLM into Ollama with a keep-alive, so the first chat does not
+  pay for loading the model
+
+Steps that fail (e.g. Neo4j still starting) are retried every
+`GRAPH_RAG_WARMUP_RETRY` seconds until they all succeed.
+"""
+import os
+import time
+import asyncio
+import retrieval_mechs
+from retrieval_mechs import RETRIEVAL_BACKEND, async_retrieve_context
+from run_query import async_client, LLM_MODEL, LLM_KEEP_ALIVE
+from metrics import READY
+
+DEFAULT_QUESTIONS = "What is pulse wave velocity?|What causes central sleep apnea?"
+
+
+class Readiness:
+    """Warm-up progress: each step is pending, done or failed."""
+
+    def __init__(self, steps):
+        self.steps = {name: {"status": "pending"} for name in steps}
+        self.started = time.time()
+        self.ready_after = None
+
+    @property
+    def ready(self):
+        return all(step["status"] == "done" for step in self.steps.values())
+
+    def mark(self, name, status, **details):
+        self.steps[name] = {"status": status, **details}
+        if self.ready and self.ready_after is None:
+            self.ready_after = round(time.time() - self.started, 3)
+            READY.set(1)
+
+    def stats(self):
+        return {"ready": self.ready, "ready_after_seconds": self.ready_after, "steps": self.steps}
+
+
+# --- Warm-up steps ---
+async def warm_neo4j_pool(connections):
+    """Check both drivers can reach Neo4j and fill the async pool."""
+    await asyncio.to_thread(retrieval_mechs.driver.verify_connectivity)
+    await retrieval_mechs.async_driver.verify_connectivity()
+    # Concurrent sessions force the pool to open that many connections
+    await asyncio.gather(*(retrieval_mechs._async_run("RETURN 1") for _ in range(connections)))
+
+async def warm_retrieval(questions):
+    # Same call the chat endpoints make (loads the CSR graph on the memory backend)
+    for question in questions:
+        await async_retrieve_context(question, topk_entities=5, combined=True)
+
+async def warm_llm():
+    # An empty prompt loads the model without generating anything
+    await async_client.generate(model=LLM_MODEL, prompt="", keep_alive=LLM_KEEP_ALIVE)
+
+
+async def run_warmup(readiness, steps, retry=5.0):
+    """Run every step until it succeeds."""
+    pending = dict(steps)
+    while pending:
+        for name, step in list(pending.items()):
+            start = time.perf_counter()
+            try:
+                await step()
+            except Exception as e:
+                readiness.mark(name, "failed", error=str(e))
+                print(f"⚠️ Warm-up step {name} failed: {e}")
+                continue
+            readiness.mark(name, "done", seconds=round(time.perf_counter() - start, 3))
+            del pending[name]
+        if pending:
+            await asyncio.sleep(retry)
+    print(f"✅ Warm-up finished in {readiness.ready_after}s")
+
+
+def warmup_from_env():
+    """Returns (readiness, coroutine function running the warm-up), or (readiness, None) when disabled."""
+    if os.environ.get("GRAPH_RAG_WARMUP", "1") == "0":
+        readiness = Readiness([])
+        READY.set(1)
+        return readiness, None
+
+    questions = [q for q in os.environ.get("GRAPH_RAG_WARMUP_QUESTIONS", DEFAULT_QUESTIONS).split("|") if q.strip()]
+    connections = int(os.environ.get("GRAPH_RAG_WARMUP_CONNECTIONS", 4))
+    steps = {}
+    if RETRIEVAL_BACKEND != "memory":
+        steps["neo4j"] = lambda: warm_neo4j_pool(connections)
+    steps["retrieval"] = lambda: warm_retrieval(questions)
+    steps["llm"] = warm_llm
+
+    readiness = Readiness(steps)
+    READY.set(0)
+    retry = float(os.environ.get("GRAPH_RAG_WARMUP_RETRY", 5))
+    return readiness, lambda: run_warmup(readiness, steps, retry=retry)
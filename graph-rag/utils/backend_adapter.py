@@ -7,49 +7,95 @@ from pathlib import Path
 backend_path = Path(__file__).parent.parent.parent / 'backend'
 sys.path.insert(0, str(backend_path))
 
-def query_backend(question):
+ERROR_ANSWER = "I apologize, but I encountered an error while processing your question. Please try again or rephrase your question."
+
+def answer_question(question):
     """
-    Simple wrapper to query the backend without modifying existing files
+    Run retrieval and generation for one question. Assumes the working
+    directory is already the backend directory.
     """
+    from retrieval_mechs import cached_retrieve_context
+    from run_query import answer_with_graph_rag_llama
+
     try:
-        # Change to backend directory
-        original_cwd = os.getcwd()
-        os.chdir(backend_path)
-        
-        # Import after changing directory
-        from retrieval_mechs import retrieve_context
-        from run_query import answer_with_graph_rag_llama
-        
         # Retrieve context
-        retrievals = retrieve_context(question, topk_entities=5)
-        
+        retrievals = cached_retrieve_context(question, topk_entities=5, combined=True)
+
         # Generate answer
         answer = answer_with_graph_rag_llama(question, retrievals)
-        
-        # Restore original directory
-        os.chdir(original_cwd)
-        
+
         return {
             "answer": answer,
             "entitiesUsed": len(retrievals),
             "success": True
         }
-        
+
     except Exception as e:
-        # Restore original directory
-        os.chdir(original_cwd)
-        
         return {
-            "answer": "I apologize, but I encountered an error while processing your question. Please try again or rephrase your question.",
+            "answer": ERROR_ANSWER,
             "error": str(e),
             "success": False,
             "entitiesUsed": 0
         }
 
+def query_backend(question):
+    """
+    Simple wrapper to query the backend without modifying existing files
+    """
+    # Change to backend directory
+    original_cwd = os.getcwd()
+    os.chdir(backend_path)
+    try:
+        return answer_question(question)
+    finally:
+        # Restore original directory
+        os.chdir(original_cwd)
+
+def serve_worker():
+    """
+    Long-lived worker mode used by the Next.js worker pool.
+
+    Protocol (JSON lines): the worker prints {"type": "ready"} once its
+    imports and Neo4j driver are set up, then answers each stdin line
+    {"id": ..., "question": ...} with one stdout line {"id": ..., ...result}.
+    """
+    protocol_out = sys.stdout
+    # Keep stray prints from backend modules off the protocol channel
+    sys.stdout = sys.stderr
+
+    def send(message):
+        protocol_out.write(json.dumps(message) + "\n")
+        protocol_out.flush()
+
+    os.chdir(backend_path)
+    import retrieval_mechs  # noqa: F401  (warm imports before signalling ready)
+    import run_query  # noqa: F401
+    send({"type": "ready", "pid": os.getpid()})
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            send({"id": None, "answer": ERROR_ANSWER, "error": f"Invalid request: {e}", "success": False, "entitiesUsed": 0})
+            continue
+
+        question = str(request.get("question", "")).strip()
+        if question:
+            result = answer_question(question)
+        else:
+            result = {"error": "No question provided", "success": False}
+        send({"id": request.get("id"), **result})
+
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        serve_worker()
+    elif len(sys.argv) > 1:
         question = " ".join(sys.argv[1:])
         result = query_backend(question)
         print(json.dumps(result))
     else:
-        print(json.dumps({"error": "No question provided", "success": False}))
\ No newline at end of file
+        print(json.dumps({"error": "No question provided", "success": False}))
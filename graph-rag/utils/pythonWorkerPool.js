@@ -0,0 +1,164 @@
+import { spawn } from 'child_process';
+import path from 'path';
+import readline from 'readline';
+
+const POOL_SIZE = parseInt(process.env.PYTHON_WORKERS || '2', 10);
+const PYTHON_BIN = process.env.PYTHON_BIN || 'python';
+const RESTART_DELAY_MS = 1000;
+
+export class WorkerTimeoutError extends Error {
+  constructor(message) {
+    super(message);
+    this.name = 'WorkerTimeoutError';
+  }
+}
+
+// One warm `backend_adapter.py --worker` process. Handles a single request at a time.
+class PythonWorker {
+  constructor(pool) {
+    this.pool = pool;
+    this.ready = false;
+    this.current = null;
+    this.stopped = false;
+    this.exited = false;
+
+    const adapterPath = path.join(process.cwd(), 'utils', 'backend_adapter.py');
+    this.process = spawn(PYTHON_BIN, [adapterPath, '--worker'], {
+      cwd: process.cwd(),
+    });
+
+    readline.createInterface({ input: this.process.stdout }).on('line', (line) => this.onLine(line));
+
+    this.process.stderr.on('data', (data) => {
+      console.error(`[python worker ${this.process.pid}]`, data.toString().trimEnd());
+    });
+
+    // A failed spawn emits 'error' without 'exit'; either way the worker is gone
+    this.process.on('error', (error) => {
+      console.error('Python worker error:', error);
+      this.onExit(null);
+    });
+
+    // Writing to a worker that just died raises EPIPE here; 'exit' handles the rest
+    this.process.stdin.on('error', (error) => {
+      console.error('Python worker stdin error:', error.message);
+    });
+
+    this.process.on('exit', (code) => this.onExit(code));
+  }
+
+  get idle() {
+    return this.ready && !this.current && !this.stopped;
+  }
+
+  onLine(line) {
+    let message;
+    try {
+      message = JSON.parse(line);
+    } catch {
+      console.error('Unexpected python worker output:', line);
+      return;
+    }
+
+    if (message.type === 'ready') {
+      this.ready = true;
+      this.pool.dispatch();
+      return;
+    }
+
+    const job = this.current;
+    if (!job || message.id !== job.id) {
+      return;
+    }
+
+    clearTimeout(job.timer);
+    this.current = null;
+    const { id, ...result } = message;
+    job.resolve(result);
+    this.pool.dispatch();
+  }
+
+  run(job) {
+    this.current = job;
+    clearTimeout(job.timer);
+    job.timer = setTimeout(() => {
+      // The python side cannot be interrupted mid-request, so replace the worker
+      this.current = null;
+      job.reject(new WorkerTimeoutError('Request timeout'));
+      this.stop();
+    }, Math.max(job.deadline - Date.now(), 0));
+
+    this.process.stdin.write(JSON.stringify({ id: job.id, question: job.question }) + '\n');
+  }
+
+  stop() {
+    this.stopped = true;
+    this.process.kill();
+  }
+
+  onExit(code) {
+    if (this.exited) {
+      return;
+    }
+    this.exited = true;
+    this.stopped = true;
+    if (this.current) {
+      clearTimeout(this.current.timer);
+      this.current.reject(new Error(`Python worker exited with code ${code}`));
+      this.current = null;
+    }
+    this.pool.replace(this);
+  }
+}
+
+class PythonWorkerPool {
+  constructor(size) {
+    this.nextId = 0;
+    this.queue = [];
+    this.workers = [];
+    for (let i = 0; i < size; i++) {
+      this.workers.push(new PythonWorker(this));
+    }
+  }
+
+  // Resolves with the adapter's result; the timeout covers queueing and processing
+  request(question, timeoutMs) {
+    return new Promise((resolve, reject) => {
+      const job = { id: ++this.nextId, question, deadline: Date.now() + timeoutMs, resolve, reject };
+      job.timer = setTimeout(() => {
+        this.queue = this.queue.filter((queued) => queued !== job);
+        reject(new WorkerTimeoutError('Request timeout'));
+      }, timeoutMs);
+      this.queue.push(job);
+      this.dispatch();
+    });
+  }
+
+  dispatch() {
+    for (const worker of this.workers) {
+      if (this.queue.length === 0) {
+        return;
+      }
+      if (worker.idle) {
+        worker.run(this.queue.shift());
+      }
+    }
+  }
+
+  replace(worker) {
+    setTimeout(() => {
+      const index = this.workers.indexOf(worker);
+      if (index !== -1) {
+        this.workers[index] = new PythonWorker(this);
+      }
+    }, RESTART_DELAY_MS);
+  }
+}
+
+// Keep a single pool per server process (survives Next.js dev hot reloads)
+export function getWorkerPool() {
+  if (!globalThis.__pythonWorkerPool) {
+    globalThis.__pythonWorkerPool = new PythonWorkerPool(POOL_SIZE);
+  }
+  return globalThis.__pythonWorkerPool;
+}